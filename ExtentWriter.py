@@ -0,0 +1,111 @@
+import os
+
+# Saved files are written in WRITE_EXTENT byte extents, one writev per extent
+WRITE_EXTENT = 1024 * 1024
+
+# Durability of saved files: 'none' leaves flushing to the OS, 'end' fdatasyncs
+# before the file is published, 'periodic' also syncs every SYNC_INTERVAL bytes
+DURABILITY = 'none'
+SYNC_INTERVAL = 16 * 1024 * 1024
+
+def set_durability(durability):
+    # Default for writers created without one, set from the --durability flag
+    global DURABILITY
+    DURABILITY = durability
+
+def resolve_durability(durability=None):
+    return durability or DURABILITY
+
+def fsync_directory(path):
+    # Make a rename into the directory holding path durable
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def get_unique_filename(save_dir, filename):
+    base, ext = os.path.splitext(filename)
+    counter = 1
+    new_filename = filename
+    
+    while os.path.exists(os.path.join(save_dir, new_filename)):
+        new_filename = f"{base} ({counter}){ext}"
+        counter += 1
+    
+    return new_filename
+
+class ExtentWriter:
+    # Gathers small chunks into large extents written with one writev each. The file
+    # is written under a hidden temporary name and renamed into place by publish(),
+    # so a partially written file is never visible in the save directory
+    def __init__(self, save_dir, durability=None):
+        self.save_dir = save_dir
+        self.durability = resolve_durability(durability)
+        self.temp_path = os.path.join(save_dir, f".{os.urandom(6).hex()}.part")
+        self.fd = os.open(self.temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        self.pending = []
+        self.pending_size = 0
+        self.written = 0
+        self.synced = 0
+        try:
+            self.iov_max = os.sysconf('SC_IOV_MAX')
+        except (AttributeError, ValueError, OSError):
+            self.iov_max = 1024
+
+    def write(self, data):
+        if not data:
+            return
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= WRITE_EXTENT:
+            self._flush()
+
+    def _flush(self):
+        buffers = self.pending
+        self.pending = []
+        self.pending_size = 0
+        index = 0
+        while index < len(buffers):
+            if hasattr(os, 'writev'):
+                written = os.writev(self.fd, buffers[index:index + self.iov_max])
+            else:
+                written = os.write(self.fd, buffers[index])
+            self.written += written
+            # Skip what was written, keep the tail of a partly written buffer
+            while index < len(buffers) and written >= len(buffers[index]):
+                written -= len(buffers[index])
+                index += 1
+            if written:
+                buffers[index] = memoryview(buffers[index])[written:]
+        if self.durability == 'periodic' and self.written - self.synced >= SYNC_INTERVAL:
+            self._sync()
+
+    def _sync(self):
+        if hasattr(os, 'fdatasync'):
+            os.fdatasync(self.fd)
+        else:
+            os.fsync(self.fd)
+        self.synced = self.written
+
+    def publish(self, save_path):
+        # Flush, sync as the policy asks, then atomically rename to save_path
+        try:
+            self._flush()
+            if self.durability != 'none':
+                self._sync()
+        finally:
+            os.close(self.fd)
+            self.fd = None
+        os.replace(self.temp_path, save_path)
+        if self.durability != 'none':
+            fsync_directory(save_path)
+        return save_path
+
+    def abort(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
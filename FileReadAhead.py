@@ -0,0 +1,81 @@
+import os
+import queue
+import threading
+
+# Read-ahead: files are read in READ_AHEAD_BLOCK byte blocks, with up to
+# READ_AHEAD_DEPTH blocks kept ready ahead of the send loop
+READ_AHEAD_BLOCK = 1024 * 1024
+READ_AHEAD_DEPTH = 4
+
+class FileReadAhead:
+    # Reads files back-to-back on a background thread and keeps up to depth blocks
+    # of block_size bytes ready, so a slow disk does not stall the send loop
+    def __init__(self, file_paths, depth=None, block_size=None):
+        self.file_paths = file_paths
+        self.depth = depth or READ_AHEAD_DEPTH
+        self.block_size = block_size or READ_AHEAD_BLOCK
+        self.blocks = queue.Queue(maxsize=self.depth)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._read)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def _advise(self, file, offset, length, advice):
+        # Hints only, not every platform has posix_fadvise
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(file.fileno(), offset, length, advice)
+            except OSError:
+                pass
+    
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _read(self):
+        try:
+            for path in self.file_paths:
+                with open(path, 'rb', buffering=0) as file:
+                    if hasattr(os, 'posix_fadvise'):
+                        self._advise(file, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                        self._advise(file, 0, self.depth * self.block_size, os.POSIX_FADV_WILLNEED)
+                    offset = 0
+                    while True:
+                        block = file.read(self.block_size)
+                        if not block:
+                            break
+                        offset += len(block)
+                        # Ask the kernel for the block the queue will want next
+                        if hasattr(os, 'posix_fadvise'):
+                            self._advise(file, offset + (self.depth - 1) * self.block_size, self.block_size, os.POSIX_FADV_WILLNEED)
+                        if not self._put(block):
+                            return
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+    
+    def __iter__(self):
+        # Yields the raw blocks of all files in order
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            if isinstance(block, Exception):
+                raise block
+            yield block
+    
+    def chunks(self, chunk_size=1024):
+        # Yields chunk_size slices; blocks are a multiple of the chunk size so only a
+        # file's last chunk is short
+        for block in self:
+            for start in range(0, len(block), chunk_size):
+                yield block[start:start + chunk_size]
+    
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
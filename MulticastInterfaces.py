@@ -0,0 +1,36 @@
+import socket
+import struct
+
+# Interfaces are named by one of their local IPv4 addresses; None leaves the choice
+# to the routing table (INADDR_ANY). A striped transfer sends stripe k to the group
+# k addresses above the base group, out of interface k modulo the interface count,
+# so NICs on a shared segment never deliver each other's stripes.
+
+def interface_address(interface):
+    return socket.inet_aton(interface) if interface else struct.pack('!I', socket.INADDR_ANY)
+
+def stripe_group(group, index):
+    address = struct.unpack('!I', socket.inet_aton(group))[0] + index
+    return socket.inet_ntoa(struct.pack('!I', address))
+
+def stripe_lanes(group, stripes=1, interfaces=None):
+    # (group, interface) of every stripe
+    interfaces = interfaces or [None]
+    return [(stripe_group(group, index), interfaces[index % len(interfaces)]) for index in range(max(1, stripes))]
+
+def memberships(group, stripes=1, interfaces=None):
+    # What a receiver joins: each stripe on its interface, or without striping the
+    # group on every interface
+    if stripes > 1:
+        return stripe_lanes(group, stripes, interfaces)
+    return [(group, interface) for interface in interfaces or [None]]
+
+def join_groups(sock, group, stripes=1, interfaces=None):
+    for member_group, interface in memberships(group, stripes, interfaces):
+        mreq = socket.inet_aton(member_group) + interface_address(interface)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+def set_multicast_interface(sock, interface):
+    # Outgoing multicast leaves through this interface instead of the routed default
+    if interface:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
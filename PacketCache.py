@@ -0,0 +1,60 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Default byte budget of a prepared packet cache
+CACHE_BYTES = 64 * 1024 * 1024
+
+def content_key(paths, chunk_size, kind='file', names=None):
+    # Identifies prepared content: a change to any file's size or mtime misses the cache.
+    # names are what each file is called inside the content (a batch manifest's relative
+    # paths), the same files sent under other names are other content
+    stats = []
+    for index, path in enumerate(paths):
+        stat = os.stat(path)
+        name = names[index] if names is not None else None
+        stats.append((os.path.abspath(path), name, stat.st_mtime_ns, stat.st_size))
+    return (kind, chunk_size, tuple(stats))
+
+class PacketCache:
+    # LRU of prepared packet sequences bounded by their total size in bytes;
+    # anything larger than the whole budget is never stored
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def fits(self, size):
+        return 0 < self.max_bytes and size <= self.max_bytes
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        if not self.fits(size):
+            return False
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                evicted_key, (evicted, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
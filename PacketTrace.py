@@ -0,0 +1,159 @@
+import time
+import struct
+import socket
+import atexit
+import threading
+
+# Binary trace: an 8 byte magic, a header (role, wall-clock start in ns), then one
+# record per datagram: offset from start in ns, direction, IPv4 address, port,
+# payload length, followed by the payload itself
+TRACE_MAGIC = b'MCTRACE1'
+TRACE_HEADER = struct.Struct('<Bq')
+TRACE_RECORD = struct.Struct('<qB4sHI')
+
+# Record directions, as seen by the process that wrote the trace
+TRACE_IN = 0
+TRACE_OUT = 1
+
+# Which side wrote the trace; replays feed receivers the datagrams a receiver saw
+# arrive, or the datagrams a sender put on the wire
+ROLE_RECEIVER = 0
+ROLE_SENDER = 1
+
+class TraceWriter:
+    def __init__(self, path, role=ROLE_RECEIVER, buffer_size=1024 * 1024):
+        self.path = path
+        self.role = role
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.lock = threading.Lock()
+        self.started = time.perf_counter_ns()
+        self.records = 0
+        self.closed = False
+        self.file.write(TRACE_MAGIC + TRACE_HEADER.pack(role, time.time_ns()))
+        atexit.register(self.close)
+
+    def record(self, data, addr, direction=TRACE_IN):
+        offset = time.perf_counter_ns() - self.started
+        try:
+            address = socket.inet_aton(addr[0])
+        except OSError:
+            address = b'\x00\x00\x00\x00'
+        header = TRACE_RECORD.pack(offset, direction, address, addr[1], len(data))
+        with self.lock:
+            if self.closed:
+                return
+            self.file.write(header)
+            self.file.write(data)
+            self.records += 1
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.file.close()
+        print(f"Trace {self.path} closed ({self.records} datagrams)")
+
+class TracingSocket:
+    # Wraps a socket and records every datagram sent or received through it
+    def __init__(self, sock, trace):
+        self.sock = sock
+        self.trace = trace
+
+    def recvfrom(self, bufsize):
+        data, addr = self.sock.recvfrom(bufsize)
+        self.trace.record(data, addr, TRACE_IN)
+        return data, addr
+
+    def sendto(self, data, addr):
+        sent = self.sock.sendto(data, addr)
+        self.trace.record(data, addr, TRACE_OUT)
+        return sent
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+def read_trace(path):
+    # Yields the role first, then (offset_ns, direction, (ip, port), payload) per record
+    with open(path, 'rb') as file:
+        if file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a packet trace")
+        role, wall_start = TRACE_HEADER.unpack(file.read(TRACE_HEADER.size))
+        yield role
+        while True:
+            header = file.read(TRACE_RECORD.size)
+            if len(header) < TRACE_RECORD.size:
+                break
+            offset, direction, address, port, length = TRACE_RECORD.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                break  # Truncated by a crash while recording
+            yield offset, direction, (socket.inet_ntoa(address), port), payload
+
+def iter_datagrams(path, realtime=False, speed=1.0):
+    # The datagrams a receiver should see, as fast as possible or at recorded timing
+    records = read_trace(path)
+    role = next(records)
+    wanted = TRACE_OUT if role == ROLE_SENDER else TRACE_IN
+    started = time.perf_counter_ns()
+    for offset, direction, addr, payload in records:
+        if direction != wanted:
+            continue
+        if realtime:
+            delay = offset / speed - (time.perf_counter_ns() - started)
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        yield payload, addr
+
+class NullSocket:
+    # Swallows everything a replayed receiver tries to send
+    def sendto(self, data, addr):
+        return len(data)
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+class ReplaySocket(NullSocket):
+    # Stands in for the receive socket: recvfrom() returns traced datagrams and
+    # raises EOFError at the end of the trace
+    def __init__(self, path, realtime=False, speed=1.0):
+        self.datagrams = iter_datagrams(path, realtime, speed)
+        self.packets = 0
+        self.bytes = 0
+
+    def recvfrom(self, bufsize):
+        for data, addr in self.datagrams:
+            self.packets += 1
+            self.bytes += len(data)
+            return data[:bufsize], addr
+        raise EOFError("end of trace")
+
+def replay_trace(path, handler, realtime=False, speed=1.0):
+    # Calls handler(data, addr) for every datagram and reports the throughput
+    packets = 0
+    total_bytes = 0
+    started = time.perf_counter()
+    for data, addr in iter_datagrams(path, realtime, speed):
+        handler(data, addr)
+        packets += 1
+        total_bytes += len(data)
+    return replay_summary(packets, total_bytes, time.perf_counter() - started)
+
+def replay_summary(packets, total_bytes, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    summary = {
+        'packets': packets,
+        'bytes': total_bytes,
+        'elapsed': elapsed,
+        'packets_per_second': packets / elapsed,
+        'mb_per_second': total_bytes / elapsed / (1024 * 1024)
+    }
+    print(f"Replayed {packets} datagrams ({total_bytes} bytes) in {elapsed:.3f}s: "
+          f"{summary['packets_per_second']:.0f} pkt/s, {summary['mb_per_second']:.2f} MB/s")
+    return summary
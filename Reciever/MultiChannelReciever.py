@@ -0,0 +1,602 @@
+import socket
+import struct
+import os
+import threading
+import queue
+import hashlib
+import sys
+import time
+import json
+import tempfile
+import bisect
+import argparse
+
+# Shared helpers live one directory up, next to SenderA.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PacketTrace import TraceWriter, TracingSocket, ReplaySocket, replay_summary
+from MulticastInterfaces import join_groups, set_multicast_interface
+from ExtentWriter import ExtentWriter, WRITE_EXTENT, DURABILITY, set_durability, get_unique_filename
+
+# Seconds between heartbeats that keep this receiver in the sender's membership table
+HEARTBEAT_INTERVAL = 3.0
+
+# JOIN_CHANNEL and HEARTBEAT go to the sender's control group, not the data group
+CONTROL_GROUP = '224.3.29.72'
+CONTROL_PORT = 10001
+
+# Reassembly buffers spill to a temporary file once a transfer holds more than
+# TRANSFER_MEMORY_BUDGET bytes or all buffers together exceed GLOBAL_MEMORY_BUDGET
+TRANSFER_MEMORY_BUDGET = 8 * 1024 * 1024
+GLOBAL_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Progress events are sent at most once per PROGRESS_INTERVAL seconds per transfer
+PROGRESS_INTERVAL = 0.5
+
+class MemoryBudget:
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self.spilled_bytes = 0
+        self.spilled_buffers = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        with self.lock:
+            if self.in_use + size > self.limit:
+                return False
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+            return True
+
+    def release(self, size):
+        with self.lock:
+            self.in_use -= size
+
+    def record_spill(self, size):
+        with self.lock:
+            self.spilled_bytes += size
+            self.spilled_buffers += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'memory_limit': self.limit,
+                'memory_in_use': self.in_use,
+                'memory_peak': self.peak,
+                'spilled_bytes': self.spilled_bytes,
+                'spilled_buffers': self.spilled_buffers
+            }
+
+memory_budget = MemoryBudget(GLOBAL_MEMORY_BUDGET)
+
+class ChunkReader:
+    # Seekable read-only view of in-memory chunks keyed by offset. Holes read as zeros
+    # but only for the bytes asked for, so a chunk far out never costs the gap before it
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.offsets = sorted(chunks)
+        self.size = max((offset + len(chunks[offset]) for offset in self.offsets), default=0)
+        self.position = 0
+
+    def seek(self, position):
+        self.position = position
+        return position
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.position + size)
+        if end <= self.position:
+            return b''
+        data = bytearray(end - self.position)
+        index = max(0, bisect.bisect_right(self.offsets, self.position) - 1)
+        while index < len(self.offsets) and self.offsets[index] < end:
+            offset = self.offsets[index]
+            chunk = self.chunks[offset]
+            start = max(offset, self.position)
+            stop = min(offset + len(chunk), end)
+            if start < stop:
+                data[start - self.position:stop - self.position] = chunk[start - offset:stop - offset]
+            index += 1
+        self.position = end
+        return bytes(data)
+
+class SpillBuffer:
+    # Reassembly buffer keyed by byte offset, kept in memory until a budget is exceeded
+    def __init__(self, limit=None, budget=None):
+        self.limit = limit if limit is not None else TRANSFER_MEMORY_BUDGET
+        self.budget = budget or memory_budget
+        self.chunks = {}  # offset -> bytes while in memory
+        self.extents = {}  # offset -> length of every chunk received, in memory or spilled
+        self.memory_size = 0
+        self.file = None
+        self.received = 0
+
+    def write(self, offset, data):
+        # Returns False for a duplicate chunk
+        if offset in self.extents:
+            return False
+        self.extents[offset] = len(data)
+        self.received += len(data)
+        
+        if self.file is None:
+            if self.memory_size + len(data) <= self.limit and self.budget.reserve(len(data)):
+                self.chunks[offset] = data
+                self.memory_size += len(data)
+                return True
+            self._spill()
+        self.file.seek(offset)
+        self.file.write(data)
+        return True
+
+    def append(self, data):
+        self.write(self.received, data)
+
+    def _spill(self):
+        self.file = tempfile.TemporaryFile(prefix='mucast_')
+        for offset, chunk in self.chunks.items():
+            self.file.seek(offset)
+            self.file.write(chunk)
+        self.budget.release(self.memory_size)
+        self.budget.record_spill(self.memory_size)
+        self.chunks = {}
+        self.memory_size = 0
+
+    def missing(self, start, length):
+        # Byte ranges [offset, length] inside start..start+length that no chunk covered
+        gaps = []
+        position = start
+        end = start + length
+        for offset in sorted(self.extents):
+            if offset + self.extents[offset] <= position:
+                continue
+            if offset >= end:
+                break
+            if offset > position:
+                gaps.append([position, offset - position])
+            position = max(position, offset + self.extents[offset])
+        if position < end:
+            gaps.append([position, end - position])
+        return gaps
+
+    def blocks(self):
+        # The data in offset order without joining it, spilled data in WRITE_EXTENT blocks;
+        # lost chunks read as zeros so every chunk stays at its own offset
+        if self.file is not None:
+            self.file.flush()
+            self.file.seek(0)
+            while True:
+                block = self.file.read(WRITE_EXTENT)
+                if not block:
+                    break
+                yield block
+        else:
+            position = 0
+            for offset in sorted(self.chunks):
+                while position < offset:
+                    gap = min(offset - position, WRITE_EXTENT)
+                    yield bytes(gap)
+                    position += gap
+                yield self.chunks[offset]
+                position = max(position, offset + len(self.chunks[offset]))
+
+    def reader(self):
+        # Seekable view of the data by offset, see ChunkReader for the in-memory one.
+        # Holes read as zeros, check missing() before trusting a range
+        if self.file is not None:
+            self.file.flush()
+            self.file.seek(0)
+            return self.file
+        return ChunkReader(self.chunks)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.budget.release(self.memory_size)
+        self.chunks = {}
+        self.memory_size = 0
+
+def print_event(event, info):
+    # Console subscriber for transfer events, the default on_event
+    where = f" for channel '{info['channel']}'"
+    if event == 'started':
+        print(f"\nReceiving {info['kind']}{where}: {info['name']}")
+        print(f"{info['kind'].capitalize()} size: {info['size']} bytes")
+    elif event == 'progress':
+        print(f"Progress{where}: {info['received']}/{info['size']} bytes", end='\r')
+    elif event == 'completed':
+        if info['kind'] == 'batch':
+            print(f"\nBatch {info['name']} saved successfully{where} ({info['saved_files']}/{info['files']} files)!")
+        else:
+            print(f"\nFile {os.path.basename(info['path'])} saved successfully{where}!")
+    elif event == 'failed':
+        print(f"\nError saving {info['kind']} {info['name']}{where}: {info['error']}")
+
+class TransferEvents:
+    # Passes transfer events (started, progress, completed, failed) to a callback
+    # as callback(event, info); progress is throttled per transfer
+    def __init__(self, callback=None, interval=None):
+        self.callback = callback or print_event
+        self.interval = interval if interval is not None else PROGRESS_INTERVAL
+        self.last_progress = {}
+
+    def progress_due(self, key):
+        # Checked before building a progress event so throttled packets cost one lookup
+        now = time.time()
+        if now - self.last_progress.get(key, 0) < self.interval:
+            return False
+        self.last_progress[key] = now
+        return True
+
+    def emit(self, event, key, info):
+        if event in ('completed', 'failed'):
+            self.last_progress.pop(key, None)
+        try:
+            self.callback(event, info)
+        except Exception as e:
+            print(f"Error in event callback: {e}")
+
+def report_memory():
+    stats = memory_budget.stats()
+    print(f"Buffer memory: {stats['memory_in_use']}/{stats['memory_limit']} bytes in use "
+          f"(peak {stats['memory_peak']}), {stats['spilled_bytes']} bytes spilled to disk")
+
+def safe_relative_path(relative_path):
+    # Reject manifest paths that would escape the batch directory
+    parts = [part for part in relative_path.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or '..' in parts or os.path.isabs(relative_path):
+        return None
+    return os.path.join(*parts)
+
+def subscribed_channels(channel_field, subscriptions):
+    # A send may target several channels at once, named comma-separated; returns the
+    # ones we subscribe to, joined the same way, or None
+    names = [name for name in channel_field.split(',') if name in subscriptions]
+    return ','.join(names) if names else None
+
+def save_batch(save_dir, batch, channel_name):
+    # Read the stream in offset order and split it using the manifest,
+    # returns (files saved, files in the manifest)
+    buffer = batch['buffer']
+    if buffer.received < batch['total_size']:
+        print(f"Warning: batch '{batch['name']}' incomplete ({buffer.received}/{batch['total_size']} bytes)")
+    
+    if buffer.missing(0, batch['manifest_size']):
+        raise ValueError("manifest incomplete")
+    stream = buffer.reader()
+    manifest = json.loads(stream.read(batch['manifest_size']).decode())
+    
+    # An unnamed batch (single files sent by the daemon) goes straight into save_dir
+    if batch['name']:
+        batch_dir = os.path.join(save_dir, get_unique_filename(save_dir, batch['name']))
+    else:
+        batch_dir = save_dir
+    
+    saved = 0
+    for entry in manifest:
+        relative_path = safe_relative_path(entry['path'])
+        if relative_path is None:
+            print(f"Skipping unsafe path in manifest: {entry['path']}")
+            continue
+        
+        if not batch['name']:
+            relative_path = get_unique_filename(save_dir, relative_path)
+        save_path = os.path.join(batch_dir, relative_path)
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        
+        # A lost chunk only costs the files it falls in, the rest are still at their offsets
+        if buffer.missing(batch['manifest_size'] + entry['offset'], entry['size']):
+            print(f"Missing data for {entry['path']}, skipping")
+            continue
+        
+        # Copy in blocks so large files never sit in memory whole
+        md5 = hashlib.md5()
+        stream.seek(batch['manifest_size'] + entry['offset'])
+        remaining = entry['size']
+        writer = ExtentWriter(os.path.dirname(save_path))
+        try:
+            while remaining > 0:
+                block = stream.read(min(remaining, WRITE_EXTENT))
+                if not block:
+                    break
+                md5.update(block)
+                writer.write(block)
+                remaining -= len(block)
+        except Exception:
+            writer.abort()
+            raise
+        # Files that fail the checksum are never published
+        if md5.hexdigest() != entry['md5']:
+            print(f"Checksum mismatch for {entry['path']}, skipping")
+            writer.abort()
+            continue
+        writer.publish(save_path)
+        saved += 1
+    
+    return saved, len(manifest)
+
+def receive_channels_multicast(multicast_group, port, channels, receiver_name='Receiver', sock=None, trace=None, on_event=None, progress_interval=None,
+                               control_group=CONTROL_GROUP, control_port=CONTROL_PORT, interfaces=None):
+    # channels: list of {'token', 'name', 'save_dir'}; one socket serves all of them
+    # and every datagram is parsed once, then routed to its channel.
+    # sock replaces the multicast socket (a ReplaySocket for offline replays) and
+    # trace records every datagram in and out to a packet trace.
+    # on_event(event, info) gets transfer events, print_event by default.
+    # interfaces lists local IPv4 addresses to join the data group on, control
+    # messages leave through the first; None leaves both to the routing table
+    subscriptions = {channel['name']: channel for channel in channels}
+    events = TransferEvents(on_event, progress_interval)
+    
+    # A replay socket swallows control messages as well
+    control_sock = sock
+    if sock is None:
+        # Control messages leave from their own socket so every receiver has its own address
+        control_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        control_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack('b', 1))
+        set_multicast_interface(control_sock, interfaces and interfaces[0])
+        
+        # Create UDP socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        
+        # Allow multiple sockets to use the same port
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        
+        # Bind to the server address
+        sock.bind(('', port))
+        
+        # Tell the kernel to join the multicast group, on each interface if given
+        join_groups(sock, multicast_group, interfaces=interfaces)
+    
+    if trace:
+        sock = TracingSocket(sock, trace)
+        control_sock = TracingSocket(control_sock, trace)
+    
+    # Create save directories if they don't exist
+    for channel in channels:
+        if not os.path.exists(channel['save_dir']):
+            os.makedirs(channel['save_dir'])
+    
+    print(f"{receiver_name} for channels {', '.join(repr(name) for name in subscriptions)} listening on {multicast_group}:{port}")
+    
+    # Send JOIN_CHANNEL message to sender for every subscription
+    for channel in channels:
+        join_message = f"JOIN_CHANNEL|{channel['token']}|{channel['name']}"
+        control_sock.sendto(join_message.encode(), (control_group, control_port))
+        print(f"Sent JOIN_CHANNEL message for channel '{channel['name']}'")
+    
+    # Bytes delivered per channel, reported to the sender with every heartbeat
+    stats = {name: {'bytes_complete': 0} for name in subscriptions}
+    
+    def send_heartbeats():
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                for channel in channels:
+                    heartbeat = f"HEARTBEAT|{channel['token']}|{channel['name']}|{stats[channel['name']]['bytes_complete']}"
+                    control_sock.sendto(heartbeat.encode(), (control_group, control_port))
+            except Exception as e:
+                print(f"Error sending heartbeat: {e}")
+                break
+    
+    heartbeat_thread = threading.Thread(target=send_heartbeats)
+    heartbeat_thread.daemon = True
+    heartbeat_thread.start()
+    
+    # Queue for file processing
+    file_queue = queue.Queue()
+    
+    def process_file():
+        while True:
+            try:
+                file_data = file_queue.get()
+                if file_data is None:
+                    break
+                
+                # Batches are queued as a dict holding the whole stream
+                if isinstance(file_data, dict):
+                    # One copy per subscribed channel the batch was sent to
+                    try:
+                        for channel_name in file_data['channel'].split(','):
+                            info = {'kind': 'batch', 'channel': channel_name, 'transfer': file_data['id'],
+                                    'name': file_data['name'] or file_data['id'], 'size': file_data['total_size']}
+                            try:
+                                saved, total = save_batch(subscriptions[channel_name]['save_dir'], file_data, channel_name)
+                                stats[channel_name]['bytes_complete'] += file_data['buffer'].received
+                                events.emit('completed', file_data['id'], dict(info, saved_files=saved, files=total))
+                            except Exception as e:
+                                events.emit('failed', file_data['id'], dict(info, error=str(e)))
+                    finally:
+                        file_data['buffer'].close()
+                    report_memory()
+                    file_queue.task_done()
+                    continue
+                    
+                # Only files for subscribed channels are buffered and queued, and
+                # saved once for each of them
+                channel_names, file_name, file_size, data_buffer = file_data
+                try:
+                    for channel_name in channel_names.split(','):
+                        save_dir = subscriptions[channel_name]['save_dir']
+                        
+                        # Get unique filename
+                        unique_filename = get_unique_filename(save_dir, file_name)
+                        save_path = os.path.join(save_dir, unique_filename)
+                        info = {'kind': 'file', 'channel': channel_name, 'transfer': None, 'name': file_name, 'size': file_size}
+                        
+                        writer = ExtentWriter(save_dir)
+                        try:
+                            for block in data_buffer.blocks():
+                                writer.write(block)
+                            writer.publish(save_path)
+                        except Exception as e:
+                            writer.abort()
+                            events.emit('failed', (channel_name, file_name), dict(info, error=str(e)))
+                            raise
+                        
+                        events.emit('completed', (channel_name, file_name), dict(info, path=save_path))
+                        stats[channel_name]['bytes_complete'] += file_size
+                finally:
+                    data_buffer.close()
+                report_memory()
+                
+                file_queue.task_done()
+                
+            except Exception as e:
+                print(f"Error processing file: {e}")
+    
+    # Start file processing thread
+    processor_thread = threading.Thread(target=process_file)
+    processor_thread.start()
+    
+    current_file_info = None # (channel_name, file_name, file_size)
+    current_buffer = None # SpillBuffer, only for files on subscribed channels
+    received_size = 0
+    # Batches in progress by batch id, several may be interleaved
+    batches = {}
+    
+    while True:
+        try:
+            # Receive data (batch chunks carry a small header on top of the payload)
+            data, addr = sock.recvfrom(65535)
+            
+            # Check for batch messages
+            if data.startswith(b"BATCH_INFO|"):
+                parts = data.decode().split('|')
+                if len(parts) == 6:
+                    command, received_channel_name, batch_id, batch_name, manifest_size, total_size = parts
+                    # Batches for other channels are not buffered at all
+                    received_channel_name = subscribed_channels(received_channel_name, subscriptions)
+                    if received_channel_name:
+                        batches[batch_id] = {
+                            'channel': received_channel_name,
+                            'id': batch_id,
+                            'name': batch_name,
+                            'manifest_size': int(manifest_size),
+                            'total_size': int(total_size),
+                            'buffer': SpillBuffer()
+                        }
+                        events.emit('started', batch_id, {'kind': 'batch', 'channel': received_channel_name, 'transfer': batch_id,
+                                                          'name': batch_name or batch_id, 'size': int(total_size)})
+                continue
+            
+            if data.startswith(b"BATCH_DATA|"):
+                command, batch_id, offset, payload = data.split(b'|', 3)
+                current_batch = batches.get(batch_id.decode())
+                offset = int(offset)
+                # Data past the announced size would only grow the buffer, never a file
+                if current_batch and 0 <= offset and offset + len(payload) <= current_batch['total_size']:
+                    current_batch['buffer'].write(offset, payload)
+                    if events.progress_due(current_batch['id']):
+                        events.emit('progress', current_batch['id'], {'kind': 'batch', 'channel': current_batch['channel'], 'transfer': current_batch['id'],
+                                                                      'name': current_batch['name'] or current_batch['id'],
+                                                                      'size': current_batch['total_size'], 'received': current_batch['buffer'].received})
+                continue
+            
+            if data.startswith(b"BATCH_DONE|"):
+                batch_id = data.decode().split('|')[1]
+                if batch_id in batches:
+                    file_queue.put(batches.pop(batch_id))
+                continue
+            
+            # Check for DONE marker
+            if data.startswith(b"DONE"):
+                if current_buffer:
+                    file_queue.put((current_file_info[0], current_file_info[1], current_file_info[2], current_buffer))
+                current_file_info = None
+                current_buffer = None
+                continue
+            
+            # Check for FILE_INFO message
+            if data.startswith(b"FILE_INFO|"):
+                file_info_str = data.decode()
+                parts = file_info_str.split('|')
+                if len(parts) == 4:
+                    command, received_channel_name, file_name, file_size_str = parts
+                    file_size = int(file_size_str)
+                    # A new FILE_INFO abandons any unfinished file
+                    if current_buffer:
+                        current_buffer.close()
+                    subscribed = subscribed_channels(received_channel_name, subscriptions)
+                    current_file_info = (subscribed or received_channel_name, file_name, file_size)
+                    current_buffer = SpillBuffer() if subscribed else None
+                    received_size = 0
+                    
+                    # If file is for a subscribed channel, announce it
+                    if current_buffer:
+                        events.emit('started', (subscribed, file_name), {'kind': 'file', 'channel': subscribed,
+                                                                         'transfer': None, 'name': file_name, 'size': file_size})
+                
+            elif current_file_info:
+                # This is file data, assume it belongs to the current file_info
+                received_size += len(data)
+                
+                # If file is for a subscribed channel, buffer it and report progress
+                if current_buffer:
+                    current_buffer.append(data)
+                    if events.progress_due(current_file_info[:2]):
+                        events.emit('progress', current_file_info[:2], {'kind': 'file', 'channel': current_file_info[0], 'transfer': None,
+                                                                       'name': current_file_info[1], 'size': current_file_info[2], 'received': received_size})
+                    
+                    # If we've received all the data for this file, queue it
+                    if received_size >= current_file_info[2]:
+                        file_queue.put((current_file_info[0], current_file_info[1], current_file_info[2], current_buffer))
+                        current_file_info = None
+                        current_buffer = None
+                elif received_size >= current_file_info[2]:
+                    # A different channel's file is only counted until it is complete
+                    current_file_info = None
+            
+        except socket.timeout:
+            pass
+        except EOFError:
+            # End of a replayed trace
+            break
+        except Exception as e:
+            print(f"Error receiving data: {e}")
+    
+    # Cleanup
+    file_queue.put(None)
+    processor_thread.join()
+    sock.close()
+    control_sock.close()
+
+def replay_channels_trace(trace_path, channels, receiver_name='Receiver', realtime=False, speed=1.0, on_event=None, progress_interval=None):
+    # Runs the receive loop over a recorded packet trace with no network involved,
+    # returns once every file in the trace has been saved
+    replay_sock = ReplaySocket(trace_path, realtime, speed)
+    started = time.perf_counter()
+    receive_channels_multicast('0.0.0.0', 0, channels, receiver_name, sock=replay_sock, on_event=on_event, progress_interval=progress_interval)
+    return replay_summary(replay_sock.packets, replay_sock.bytes, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-channel Multicast Receiver")
+    parser.add_argument('--record', metavar='TRACE', help="record every datagram to a packet trace file")
+    parser.add_argument('--replay', metavar='TRACE', help="replay a packet trace offline instead of listening")
+    parser.add_argument('--realtime', action='store_true', help="replay at the recorded timing instead of as fast as possible")
+    parser.add_argument('--speed', type=float, default=1.0, help="timing multiplier for --realtime")
+    parser.add_argument('--durability', choices=['none', 'end', 'periodic'], default=DURABILITY, help="when saved files are synced to disk")
+    parser.add_argument('--progress-interval', type=float, default=PROGRESS_INTERVAL, help="seconds between progress updates per transfer")
+    parser.add_argument('--quiet', action='store_true', help="do not print transfer events")
+    parser.add_argument('--interface', action='append', metavar='ADDRESS', help="local IPv4 address of an interface to join on, repeat for several")
+    args = parser.parse_args()
+    set_durability(args.durability)
+    on_event = (lambda event, info: None) if args.quiet else None
+    
+    # Multicast configuration
+    MULTICAST_GROUP = '224.3.29.71'
+    PORT = 10000
+    
+    # Every subscribed channel is one entry here
+    CHANNELS = [
+        {'token': "channel_alpha_token", 'name': "Channel Alpha", 'save_dir': 'received_files_Channel_Alpha'},
+        {'token': "channel_beta_token", 'name': "Channel Beta", 'save_dir': 'received_files_Channel_Beta'},
+    ]
+    
+    if args.replay:
+        replay_channels_trace(args.replay, CHANNELS, "Multi-channel receiver", args.realtime, args.speed, on_event, args.progress_interval)
+        sys.exit(0)
+    
+    print(f"Starting multi-channel receiver for {len(CHANNELS)} channels...")
+    trace = TraceWriter(args.record) if args.record else None
+    receive_channels_multicast(MULTICAST_GROUP, PORT, CHANNELS, "Multi-channel receiver", trace=trace, on_event=on_event,
+                               progress_interval=args.progress_interval, interfaces=args.interface)
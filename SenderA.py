@@ -3,6 +3,17 @@ import struct
 import time
 import os
 import threading
+import glob
+import json
+import hashlib
+import queue
+import argparse
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PacketTrace import TraceWriter, TracingSocket, ROLE_SENDER
+from PacketCache import PacketCache, content_key, CACHE_BYTES
+from MulticastInterfaces import join_groups, set_multicast_interface
+from FileReadAhead import FileReadAhead, READ_AHEAD_DEPTH
 
 # Valid tokens for receivers and their corresponding channels/names
 VALID_CHANNELS = {
@@ -10,8 +21,46 @@ VALID_CHANNELS = {
     "channel_beta_token": "Channel Beta" # Example channel 2
 }
 
-# Dictionary to store authenticated receiver addresses for each channel
+# Dictionary to store authenticated receivers for each channel:
+# channel_name -> {addr: {'joined', 'last_seen', 'bytes_complete'}}
 authenticated_receivers = {}
+receivers_lock = threading.Lock()
+
+# Receivers that send no heartbeat for this many seconds are dropped
+RECEIVER_TIMEOUT = 10.0
+
+# Receivers send JOIN_CHANNEL and HEARTBEAT to this group and port, apart from the
+# file data, so the control plane never has to wade through data traffic
+CONTROL_GROUP = '224.3.29.72'
+CONTROL_PORT = 10001
+CONTROL_MAX_SIZE = 512
+# Control messages accepted per second from one address, and the burst allowed
+CONTROL_RATE = 20.0
+CONTROL_BURST = 40
+
+# Payload bytes carried by each data datagram
+CHUNK_SIZE = 1024
+
+# Packet trace every sending socket records into, set with --record
+packet_trace = None
+
+# Local IPv4 addresses of the interfaces to use, set with --interface: data leaves
+# through the first one, control messages are accepted on all of them. Unset, the
+# routing table picks a single interface for everything.
+multicast_interfaces = None
+
+# File blocks kept read ahead of the send loop, set with --read-ahead
+read_ahead_depth = READ_AHEAD_DEPTH
+
+# Prepared chunks (and batch manifests) of recently sent content, so sending the
+# same files again, or to another channel, skips reading and checksumming them
+packet_cache = PacketCache()
+
+def channel_field(channel_name):
+    # One send can target several channels, their names travel comma-separated
+    if isinstance(channel_name, (list, tuple)):
+        return ','.join(channel_name)
+    return channel_name
 
 def get_filetype(file_name):
     if file_name.endswith('.html'):
@@ -33,37 +82,134 @@ def get_filetype(file_name):
     else:
         return "application/octet-stream"
 
-def handle_multicast_traffic(sock, multicast_group, port):
-    print(f"Sender listening on {multicast_group}:{port} for authentication requests")
+def update_receiver(channel_name, addr, bytes_complete=None):
+    now = time.time()
+    with receivers_lock:
+        receivers = authenticated_receivers.setdefault(channel_name, {})
+        if addr not in receivers:
+            receivers[addr] = {'joined': now, 'last_seen': now, 'bytes_complete': 0}
+        receivers[addr]['last_seen'] = now
+        if bytes_complete is not None:
+            receivers[addr]['bytes_complete'] = bytes_complete
+
+def prune_receivers():
+    # Drop receivers whose heartbeat expired
+    now = time.time()
+    with receivers_lock:
+        for channel_name, receivers in authenticated_receivers.items():
+            for addr in [addr for addr, info in receivers.items() if now - info['last_seen'] > RECEIVER_TIMEOUT]:
+                del receivers[addr]
+                print(f"Receiver {addr} timed out on channel '{channel_name}'")
+
+def get_membership(channel_name=None):
+    # Snapshot of live receivers per channel for operators
+    prune_receivers()
+    now = time.time()
+    with receivers_lock:
+        return {
+            name: [{
+                'address': addr,
+                'joined': info['joined'],
+                'bytes_complete': info['bytes_complete'],
+                'idle': round(now - info['last_seen'], 3)
+            } for addr, info in receivers.items()]
+            for name, receivers in authenticated_receivers.items()
+            if channel_name is None or name == channel_name
+        }
+
+class ControlRateLimiter:
+    # Token bucket per source address; a flooding host only loses its own messages
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate or CONTROL_RATE
+        self.burst = burst or CONTROL_BURST
+        self.buckets = {}  # addr -> [tokens, last refill]
+        self.dropped = 0
+        self.last_prune = time.time()
+
+    def allow(self, addr):
+        now = time.time()
+        bucket = self.buckets.get(addr)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self.buckets[addr] = bucket
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if now - self.last_prune > RECEIVER_TIMEOUT:
+            # Forget hosts that went quiet, their buckets are full again anyway
+            self.buckets = {key: value for key, value in self.buckets.items() if now - value[1] < RECEIVER_TIMEOUT}
+            self.last_prune = now
+        if bucket[0] < 1:
+            self.dropped += 1
+            return False
+        bucket[0] -= 1
+        return True
+
+def parse_control_message(data):
+    # Returns the fields of a control datagram, or None for anything that is not one
+    if len(data) > CONTROL_MAX_SIZE or b'|' not in data:
+        return None
+    try:
+        return data.decode('ascii').split('|')
+    except UnicodeDecodeError:
+        return None
+
+def handle_join(addr, parts):
+    if len(parts) != 3:
+        print(f"Invalid JOIN_CHANNEL message format from {addr}")
+        return
+    command, token, channel_name = parts
+    if token in VALID_CHANNELS and VALID_CHANNELS[token] == channel_name:
+        # Add receiver address to the authenticated list for this channel
+        update_receiver(channel_name, addr)
+        print(f"Receiver {addr} successfully joined channel '{channel_name}'")
+    else:
+        print(f"Invalid JOIN_CHANNEL attempt from {addr} with token '{token}' for channel '{channel_name}'")
+
+def handle_heartbeat(addr, parts):
+    if len(parts) != 4:
+        return
+    command, token, channel_name, bytes_complete = parts
+    if token in VALID_CHANNELS and VALID_CHANNELS[token] == channel_name and bytes_complete.isdigit():
+        update_receiver(channel_name, addr, int(bytes_complete))
+
+# Control commands and their handlers; ACK/NACK handlers belong here as well
+CONTROL_HANDLERS = {
+    'JOIN_CHANNEL': handle_join,
+    'HEARTBEAT': handle_heartbeat
+}
+
+def open_control_socket(control_group, control_port):
+    # The control group carries only receiver-to-sender messages, never file data
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', control_port))
+    join_groups(sock, control_group, interfaces=multicast_interfaces)
+    return sock
+
+def handle_control_traffic(sock, control_group, control_port):
+    print(f"Sender listening on {control_group}:{control_port} for control messages")
+    limiter = ControlRateLimiter()
     
     while True:
         try:
-            data, addr = sock.recvfrom(1024)
-            message = data.decode()
-            
-            if message.startswith("JOIN_CHANNEL|"):
-                parts = message.split('|')
-                if len(parts) == 3:
-                    command, token, channel_name = parts
-                    if token in VALID_CHANNELS and VALID_CHANNELS[token] == channel_name:
-                        if channel_name not in authenticated_receivers:
-                            authenticated_receivers[channel_name] = {}
-                        # Add receiver address to the authenticated list for this channel
-                        authenticated_receivers[channel_name][addr] = True
-                        print(f"Receiver {addr} successfully joined channel '{channel_name}'")
-                        # Optional: Send a direct acknowledgment back to the receiver
-                        # sock.sendto(f"JOIN_SUCCESS|{channel_name}".encode(), addr)
-                    else:
-                        print(f"Invalid JOIN_CHANNEL attempt from {addr} with token '{token}' for channel '{channel_name}'")
-                        # Optional: Send a direct rejection back to the receiver
-                        # sock.sendto(b"JOIN_FAILED", addr)
-                else:
-                     print(f"Invalid JOIN_CHANNEL message format from {addr}")
-            # We can add handling for other control messages here later if needed
-            
-        except Exception as e:
-            print(f"Error in multicast traffic handler: {e}")
+            data, addr = sock.recvfrom(CONTROL_MAX_SIZE + 1)
+        except OSError as e:
+            # The socket was closed on shutdown
+            print(f"Control socket closed: {e}")
             break
+        
+        # A bad datagram is dropped on its own, it never stops the handler
+        try:
+            if not limiter.allow(addr):
+                continue
+            parts = parse_control_message(data)
+            if parts is None:
+                continue
+            handler = CONTROL_HANDLERS.get(parts[0])
+            if handler:
+                handler(addr, parts)
+        except Exception as e:
+            print(f"Error handling control message from {addr}: {e}")
 
 def send_file_multicast(file_path, multicast_group, port, channel_name):
     # Create UDP socket
@@ -72,58 +218,386 @@ def send_file_multicast(file_path, multicast_group, port, channel_name):
     # Set TTL for multicast
     ttl = struct.pack('b', 1)
     sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    set_multicast_interface(sock, multicast_interfaces and multicast_interfaces[0])
+    if packet_trace:
+        sock = TracingSocket(sock, packet_trace)
     
     try:
         # Get file size
         file_size = os.path.getsize(file_path)
+        channels = channel_field(channel_name)
         
         # Include channel name in the file info
         file_name = os.path.basename(file_path)
-        file_info = f"FILE_INFO|{channel_name}|{file_name}|{file_size}"
+        file_info = f"FILE_INFO|{channels}|{file_name}|{file_size}"
         sock.sendto(file_info.encode(), (multicast_group, port))
         time.sleep(0.1)  # Small delay to ensure receivers get the info
         
-        # Send file content
-        with open(file_path, 'rb') as file:
-            while True:
-                chunk = file.read(1024)
-                if not chunk:
-                    break
+        # Send file content from the cache, or read ahead on a background thread
+        # and keep the chunks for the next send if they fit
+        key = content_key([file_path], CHUNK_SIZE)
+        cached = packet_cache.get(key)
+        reader = None
+        recorded = None
+        if cached is None:
+            reader = FileReadAhead([file_path], read_ahead_depth)
+            if packet_cache.fits(file_size):
+                recorded = []
+        try:
+            for chunk in cached if cached is not None else reader.chunks(CHUNK_SIZE):
                 # Tag data chunks with channel name (optional but good practice)
                 # data_chunk_message = f"FILE_DATA|{channel_name}|".encode() + chunk
                 sock.sendto(chunk, (multicast_group, port))
+                if recorded is not None:
+                    recorded.append(chunk)
                 time.sleep(0.01)  # Small delay
+        finally:
+            if reader:
+                reader.close()
+        if recorded is not None:
+            packet_cache.put(key, recorded, file_size)
         
         # Send end marker
         # end_marker_message = f"DONE|{channel_name}".encode()
         sock.sendto(b"DONE", (multicast_group, port))
-        print(f"File {file_name} sent successfully to channel '{channel_name}'!")
+        print(f"File {file_name} sent successfully to channel '{channels}'!")
         
     except Exception as e:
         print(f"Error sending file: {e}")
     finally:
         sock.close()
 
+def collect_batch_files(source):
+    # A directory is walked recursively and an existing file is sent as it is, anything
+    # else is treated as a glob pattern (so names like shot[1].png are not globbed)
+    if os.path.isfile(source):
+        root = os.path.dirname(os.path.abspath(source))
+        paths = [source]
+    elif os.path.isdir(source):
+        root = source
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                paths.append(os.path.join(dirpath, filename))
+    else:
+        paths = sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+        if not paths:
+            return None, []
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    
+    return root, [(path, os.path.relpath(path, root).replace(os.sep, '/')) for path in paths]
+
+def build_manifest(files):
+    # Offsets are relative to the first byte after the manifest in the batch stream
+    manifest = []
+    offset = 0
+    for path, relative_path in files:
+        md5 = hashlib.md5()
+        size = 0
+        with open(path, 'rb') as file:
+            while True:
+                block = file.read(1024 * 1024)
+                if not block:
+                    break
+                md5.update(block)
+                size += len(block)
+        manifest.append({'path': relative_path, 'size': size, 'md5': md5.hexdigest(), 'offset': offset})
+        offset += size
+    return manifest
+
+def iter_batch_stream(manifest_data, files):
+    # Yield the manifest followed by every file back-to-back, packed into full chunks
+    buffer = bytearray(manifest_data)
+    reader = FileReadAhead([path for path, relative_path in files], read_ahead_depth)
+    try:
+        for block in reader:
+            buffer += block
+            # Slice whole chunks off the front, then drop them in one go
+            start = 0
+            while len(buffer) - start >= CHUNK_SIZE:
+                yield bytes(buffer[start:start + CHUNK_SIZE])
+                start += CHUNK_SIZE
+            del buffer[:start]
+    finally:
+        reader.close()
+    if buffer:
+        yield bytes(buffer)
+
+def send_batch_multicast(source, multicast_group, port, channel_name, batch_name=None):
+    # batch_name '' makes receivers save the files straight into their save directory
+    root, files = collect_batch_files(source)
+    if not files:
+        print(f"No files found for '{source}'")
+        return False
+    
+    # Create UDP socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    
+    # Set TTL for multicast
+    ttl = struct.pack('b', 1)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    set_multicast_interface(sock, multicast_interfaces and multicast_interfaces[0])
+    if packet_trace:
+        sock = TracingSocket(sock, packet_trace)
+    
+    try:
+        channels = channel_field(channel_name)
+        # A cached batch skips the manifest checksums as well as the file reads
+        key = content_key([path for path, relative_path in files], CHUNK_SIZE, 'batch',
+                          [relative_path for path, relative_path in files])
+        cached = packet_cache.get(key)
+        if cached is not None:
+            manifest, manifest_data, chunks = cached
+            recorded = None
+        else:
+            manifest = build_manifest(files)
+            manifest_data = json.dumps(manifest).encode()
+            chunks = iter_batch_stream(manifest_data, files)
+        total_size = len(manifest_data) + sum(entry['size'] for entry in manifest)
+        if cached is None:
+            recorded = [] if packet_cache.fits(total_size) else None
+        
+        # One BATCH_INFO announces the whole stream instead of a FILE_INFO per file
+        batch_id = os.urandom(4).hex()
+        if batch_name is None:
+            batch_name = os.path.basename(os.path.normpath(root)) or 'batch'
+        batch_info = f"BATCH_INFO|{channels}|{batch_id}|{batch_name}|{len(manifest_data)}|{total_size}"
+        sock.sendto(batch_info.encode(), (multicast_group, port))
+        time.sleep(0.1)  # Small delay to ensure receivers get the info
+        
+        # Data chunks carry the batch id and their offset in the stream
+        offset = 0
+        for chunk in chunks:
+            header = f"BATCH_DATA|{batch_id}|{offset}|".encode()
+            sock.sendto(header + chunk, (multicast_group, port))
+            if recorded is not None:
+                recorded.append(chunk)
+            offset += len(chunk)
+            time.sleep(0.01)  # Small delay
+        if recorded is not None:
+            packet_cache.put(key, (manifest, manifest_data, recorded), total_size)
+        
+        # Send end marker
+        sock.sendto(f"BATCH_DONE|{batch_id}".encode(), (multicast_group, port))
+        print(f"Batch '{batch_name}' ({len(manifest)} files, {total_size} bytes) sent successfully to channel '{channels}'!")
+        return True
+        
+    except Exception as e:
+        print(f"Error sending batch: {e}")
+        return False
+    finally:
+        sock.close()
+
+class SenderDaemon:
+    def __init__(self, multicast_group, port, hot_folder=None, workers_per_channel=1, scan_interval=1.0):
+        self.multicast_group = multicast_group
+        self.port = port
+        self.hot_folder = hot_folder
+        self.workers_per_channel = workers_per_channel
+        self.scan_interval = scan_interval
+        
+        # Job table and one queue per channel
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.channel_queues = {name: queue.Queue() for name in VALID_CHANNELS.values()}
+        
+        # Hot-folder state: path -> (size, mtime) from the previous scan, and paths already queued
+        self.seen_files = {}
+        self.queued_files = set()
+
+    def submit(self, path, token, source='api'):
+        if token not in VALID_CHANNELS:
+            raise ValueError("Invalid channel token")
+        if not os.path.exists(path):
+            raise ValueError("File not found")
+        
+        job = {
+            'id': os.urandom(4).hex(),
+            'path': path,
+            'channel': VALID_CHANNELS[token],
+            'source': source,
+            'status': 'queued',
+            'submitted': time.time(),
+            'finished': None
+        }
+        with self.jobs_lock:
+            self.jobs[job['id']] = job
+        self.channel_queues[job['channel']].put(job)
+        print(f"Queued job {job['id']}: {path} -> '{job['channel']}'")
+        return dict(job)
+
+    def list_jobs(self):
+        with self.jobs_lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def get_job(self, job_id):
+        with self.jobs_lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _worker(self, channel_name):
+        jobs = self.channel_queues[channel_name]
+        while True:
+            job = jobs.get()
+            job['status'] = 'sending'
+            # Every job is sent as a batch so concurrent sends stay apart at the receivers
+            batch_name = None if os.path.isdir(job['path']) else ''
+            ok = send_batch_multicast(job['path'], self.multicast_group, self.port, channel_name, batch_name)
+            job['status'] = 'done' if ok else 'failed'
+            job['finished'] = time.time()
+            if job['source'] == 'hot-folder':
+                self._archive(job['path'], '.sent' if ok else '.failed')
+            jobs.task_done()
+
+    def _archive(self, path, folder):
+        # Move a processed hot-folder file out of the way
+        try:
+            archive_dir = os.path.join(os.path.dirname(path), folder)
+            os.makedirs(archive_dir, exist_ok=True)
+            os.replace(path, os.path.join(archive_dir, f"{int(time.time())}_{os.path.basename(path)}"))
+        except Exception as e:
+            print(f"Error archiving {path}: {e}")
+        self.queued_files.discard(path)
+
+    def _watch_hot_folder(self):
+        # One subdirectory per channel token; a file is queued once its size and
+        # mtime are unchanged between two scans, so half-written files are skipped
+        for token in VALID_CHANNELS:
+            os.makedirs(os.path.join(self.hot_folder, token), exist_ok=True)
+        print(f"Watching hot folder {self.hot_folder}")
+        
+        while True:
+            # A failed scan is reported and retried; it must not end the watcher
+            try:
+                self.seen_files = self._scan_hot_folder()
+            except Exception as e:
+                print(f"Error scanning hot folder {self.hot_folder}: {e}")
+            time.sleep(self.scan_interval)
+
+    def _scan_hot_folder(self):
+        current = {}
+        for token in VALID_CHANNELS:
+            try:
+                entries = list(os.scandir(os.path.join(self.hot_folder, token)))
+            except OSError:
+                continue
+            for entry in entries:
+                # Files can be archived or removed between scandir and stat
+                try:
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                current[entry.path] = (stat.st_size, stat.st_mtime)
+                if entry.path in self.queued_files or self.seen_files.get(entry.path) != current[entry.path]:
+                    continue
+                self.queued_files.add(entry.path)
+                try:
+                    self.submit(entry.path, token, 'hot-folder')
+                except ValueError as e:
+                    print(f"Error queueing {entry.path}: {e}")
+                    self.queued_files.discard(entry.path)
+        return current
+
+    def start(self):
+        for channel_name in self.channel_queues:
+            for _ in range(self.workers_per_channel):
+                worker = threading.Thread(target=self._worker, args=(channel_name,))
+                worker.daemon = True
+                worker.start()
+        if self.hot_folder:
+            watcher = threading.Thread(target=self._watch_hot_folder)
+            watcher.daemon = True
+            watcher.start()
+
+    def serve(self, api_port):
+        # The job API only listens on localhost
+        self.start()
+        server = ThreadingHTTPServer(('127.0.0.1', api_port), JobRequestHandler)
+        server.sender_daemon = self
+        print(f"Sender daemon API on http://127.0.0.1:{api_port}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    # POST /jobs {"path": ..., "token": ...}, GET /jobs, GET /jobs/<id>, GET /members
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        daemon = self.server.sender_daemon
+        if self.path == '/jobs':
+            self._reply(200, daemon.list_jobs())
+        elif self.path.startswith('/jobs/'):
+            job = daemon.get_job(self.path[len('/jobs/'):])
+            self._reply(200 if job else 404, job or {'error': 'Unknown job'})
+        elif self.path == '/members':
+            self._reply(200, {name: [dict(receiver, address=list(receiver['address'])) for receiver in receivers]
+                              for name, receivers in get_membership().items()})
+        else:
+            self._reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self._reply(404, {'error': 'Not found'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            job = self.server.sender_daemon.submit(request['path'], request['token'])
+            self._reply(202, job)
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multicast File Sender")
+    parser.add_argument('--daemon', action='store_true', help="run headless with a local job API instead of the menu")
+    parser.add_argument('--api-port', type=int, default=8765, help="localhost port for the job API")
+    parser.add_argument('--hot-folder', help="queue files dropped into <hot-folder>/<channel token>/")
+    parser.add_argument('--workers', type=int, default=1, help="concurrent sends per channel")
+    parser.add_argument('--record', metavar='TRACE', help="record every datagram sent to a packet trace file")
+    parser.add_argument('--read-ahead', type=int, default=READ_AHEAD_DEPTH, help="file blocks (1 MiB each) kept read ahead of the send loop")
+    parser.add_argument('--interface', action='append', metavar='ADDRESS', help="local IPv4 address of an interface to send from (first) and take control messages on, repeatable")
+    parser.add_argument('--cache-mb', type=int, default=CACHE_BYTES // (1024 * 1024), help="MiB of prepared chunks kept for repeated sends (0 disables)")
+    args = parser.parse_args()
+    
     # Multicast configuration
     MULTICAST_GROUP = '224.3.29.71'
     MULTICAST_PORT = 10000
     
-    # Create socket for multicast traffic (both sending and receiving control messages)
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if args.record:
+        packet_trace = TraceWriter(args.record, ROLE_SENDER)
+    read_ahead_depth = max(1, args.read_ahead)
+    packet_cache = PacketCache(max(0, args.cache_mb) * 1024 * 1024)
+    multicast_interfaces = args.interface
     
-    # Bind to the multicast port
-    sock.bind(('', MULTICAST_PORT))
+    # Control socket on its own group and port, the sender no longer joins the data group
+    sock = open_control_socket(CONTROL_GROUP, CONTROL_PORT)
     
-    # Tell the kernel to join the multicast group on the sender side (can be useful)
-    mreq = struct.pack('4sL', socket.inet_aton(MULTICAST_GROUP), socket.INADDR_ANY)
-    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    # Start thread to handle incoming control messages (joins and heartbeats)
+    control_handler_thread = threading.Thread(target=handle_control_traffic, args=(sock, CONTROL_GROUP, CONTROL_PORT))
+    control_handler_thread.daemon = True
+    control_handler_thread.start()
     
-    # Start thread to handle incoming multicast traffic (authentication requests)
-    multicast_handler_thread = threading.Thread(target=handle_multicast_traffic, args=(sock, MULTICAST_GROUP, MULTICAST_PORT))
-    multicast_handler_thread.daemon = True
-    multicast_handler_thread.start()
+    if args.daemon:
+        sender_daemon = SenderDaemon(MULTICAST_GROUP, MULTICAST_PORT, args.hot_folder, args.workers)
+        try:
+            sender_daemon.serve(args.api_port)
+        except KeyboardInterrupt:
+            print("Stopping daemon...")
+        sock.close()
+        sys.exit(0)
     
     while True:
         print("\nMulticast File Sender")
@@ -131,26 +605,45 @@ if __name__ == "__main__":
         for token, name in VALID_CHANNELS.items():
             print(f"- {name} (Token: {token})")
         print("1. Send a file to a channel")
-        print("2. Exit")
-        choice = input("Enter your choice (1-2): ")
+        print("2. Send a directory or glob pattern to a channel")
+        print("3. Show channel members")
+        print("4. Exit")
+        choice = input("Enter your choice (1-4): ")
         
         if choice == '1':
-            channel_token_input = input("Enter the token for the channel you want to send to: ")
-            if channel_token_input in VALID_CHANNELS:
-                channel_name = VALID_CHANNELS[channel_token_input]
+            # Several comma-separated tokens send the file to all those channels in one pass
+            channel_tokens = [token.strip() for token in input("Enter the token(s) for the channel(s) you want to send to: ").split(',')]
+            if all(token in VALID_CHANNELS for token in channel_tokens):
+                channel_names = [VALID_CHANNELS[token] for token in channel_tokens]
                 file_path = input("Enter the path of the file to send: ")
                 if os.path.exists(file_path):
-                    # Check if there are any authenticated receivers for this channel (optional)
-                    # if channel_name in authenticated_receivers and authenticated_receivers[channel_name]:
-                    print(f"Sending file to channel '{channel_name}'...")
-                    send_file_multicast(file_path, MULTICAST_GROUP, MULTICAST_PORT, channel_name)
-                    # else:
-                    #     print(f"No authenticated receivers for channel '{channel_name}'. File not sent.")
+                    # Check if there are any live receivers for this channel (optional)
+                    for channel_name in channel_names:
+                        if not get_membership(channel_name).get(channel_name):
+                            print(f"Warning: no live receivers on channel '{channel_name}'")
+                    print(f"Sending file to channel '{channel_field(channel_names)}'...")
+                    send_file_multicast(file_path, MULTICAST_GROUP, MULTICAST_PORT, channel_names)
                 else:
                     print("File not found!")
             else:
                 print("Invalid channel token!")
         elif choice == '2':
+            channel_tokens = [token.strip() for token in input("Enter the token(s) for the channel(s) you want to send to: ").split(',')]
+            if all(token in VALID_CHANNELS for token in channel_tokens):
+                channel_names = [VALID_CHANNELS[token] for token in channel_tokens]
+                source = input("Enter the directory or glob pattern to send: ")
+                print(f"Sending batch to channel '{channel_field(channel_names)}'...")
+                send_batch_multicast(source, MULTICAST_GROUP, MULTICAST_PORT, channel_names)
+            else:
+                print("Invalid channel token!")
+        elif choice == '3':
+            membership = get_membership()
+            if not any(membership.values()):
+                print("No live receivers")
+            for name, receivers in membership.items():
+                for receiver in receivers:
+                    print(f"- {name}: {receiver['address']} ({receiver['bytes_complete']} bytes, idle {receiver['idle']}s)")
+        elif choice == '4':
             print("Exiting...")
             break
         else:
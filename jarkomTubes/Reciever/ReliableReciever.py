@@ -0,0 +1,1085 @@
+import socket
+import struct
+import os
+import threading
+import queue
+import hashlib
+import sys
+import time
+import json
+import zlib
+import argparse
+import multiprocessing
+import mmap
+import tempfile
+import stat
+import re
+from collections import deque
+
+# Helpers live one directory up next to SenderA.py, and the ones shared with the
+# multi-channel receiver one more level up
+JARKOM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(JARKOM_DIR)
+sys.path.append(os.path.dirname(JARKOM_DIR))
+from StageProfiler import StageProfiler
+from PacketTrace import TraceWriter, TracingSocket, NullSocket, replay_trace
+from MulticastInterfaces import join_groups
+from ExtentWriter import (ExtentWriter, WRITE_EXTENT, DURABILITY, SYNC_INTERVAL, set_durability, resolve_durability,
+                          fsync_directory, get_unique_filename)
+
+# Local spool shared with SenderA.py: receivers report the token the sender keeps in
+# SPOOL_DIR/HOST_TOKEN as their host, and a sender whose receivers all report its
+# token passes files as a spool path instead of multicast chunks. The last
+# SPOOL_FAILURES transfers whose spool could not be opened are listed in every ACK
+# so the sender multicasts them instead
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'mucast_spool')
+HOST_TOKEN = 'host_token'
+SPOOL_FAILURES = 8
+
+# TCP repair, see RepairServer in SenderA.py: each range of a reply starts with
+# REPAIR_HEADER (offset, length). Holes are requested in pieces of at most
+# REPAIR_PIECE bytes and written out as they are read
+REPAIR_HEADER = struct.Struct('!QI')
+REPAIR_PIECE = 8 * 1024 * 1024
+REPAIR_TIMEOUT = 10.0
+
+# Transfer journal: a header (JSON transfer info and its CRC32) followed by one
+# record per byte range written to the partial file, each range with its own CRC32
+# so a record torn by a crash is recognised and dropped
+JOURNAL_MAGIC = b'MCJRNL01'
+JOURNAL_RANGE = struct.Struct('<QI')
+JOURNAL_CRC = struct.Struct('<I')
+
+# A transfer resumed from its journal is finished from the sender's repair server
+# once no chunk of it has arrived for RESUME_IDLE seconds
+RESUME_IDLE = 3.0
+
+# Transfer ids name the journal and partial files in save_dir; the sender makes them
+# from 4 random bytes, so anything but 8 lowercase hex characters is forged
+TRANSFER_ID = re.compile(r'[0-9a-f]{8}')
+
+def valid_transfer_id(transfer_id):
+    return isinstance(transfer_id, str) and TRANSFER_ID.fullmatch(transfer_id) is not None
+
+def open_spool(path, transfer_id):
+    # Opens a spool named in FILE_INFO, only a regular file <transfer>.spool directly in
+    # SPOOL_DIR is accepted so a forged packet cannot make us save any file on this host
+    real_path = os.path.realpath(path)
+    if (os.path.dirname(real_path) != os.path.realpath(SPOOL_DIR)
+            or os.path.basename(real_path) != f"{transfer_id}.spool"):
+        raise ValueError(f"spool outside {SPOOL_DIR}: {path}")
+    spool = open(real_path, 'rb')
+    if not stat.S_ISREG(os.fstat(spool.fileno()).st_mode):
+        spool.close()
+        raise ValueError(f"spool is not a regular file: {path}")
+    return spool
+
+def read_host_token():
+    # The local sender's token, None while there is none we can read
+    try:
+        with open(os.path.join(SPOOL_DIR, HOST_TOKEN)) as token_file:
+            return token_file.read().strip() or None
+    except OSError:
+        return None
+
+class TransferJournal:
+    # Crash-safe state of one incoming transfer. Chunks are gathered into extents
+    # and written at their offsets in a hidden partial file; each extent is then
+    # recorded in the journal, so after a restart the receiver knows exactly which
+    # bytes it already has. Both files are named after the transfer id.
+    # With 'periodic' durability the partial file is synced every SYNC_INTERVAL bytes
+    # and the records held back until then, so they never describe bytes that may not
+    # be on disk; 'end' only syncs before publishing.
+    def __init__(self, save_dir, transfer_id, name, size, repair=None, durability=None, ranges=None):
+        self.transfer_id = transfer_id
+        self.name = name
+        self.size = size
+        self.repair = repair
+        self.durability = resolve_durability(durability)
+        self.path = os.path.join(save_dir, f".{transfer_id}.journal")
+        self.part_path = os.path.join(save_dir, f".{transfer_id}.part")
+        self.ranges = ranges or []  # [offset, length] of every range on disk
+        self.pending = {}  # offset -> bytes not written yet
+        self.pending_size = 0
+        self.records = []  # Journal records not appended yet
+        self.unsynced = 0  # Bytes written since the last sync
+        try:
+            self.iov_max = os.sysconf('SC_IOV_MAX')
+        except (AttributeError, ValueError, OSError):
+            self.iov_max = 1024
+        self.fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        if ranges is None:
+            info = json.dumps({'transfer': transfer_id, 'name': name, 'size': size, 'repair': repair}).encode()
+            with open(self.path, 'wb') as file:
+                file.write(JOURNAL_MAGIC + JOURNAL_CRC.pack(len(info)) + info + JOURNAL_CRC.pack(zlib.crc32(info)))
+        self.journal = open(self.path, 'ab', buffering=0)
+
+    @classmethod
+    def load(cls, save_dir, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if not data.startswith(JOURNAL_MAGIC):
+            raise ValueError(f"{path} is not a transfer journal")
+        position = len(JOURNAL_MAGIC)
+        (length,) = JOURNAL_CRC.unpack_from(data, position)
+        info = data[position + JOURNAL_CRC.size:position + JOURNAL_CRC.size + length]
+        position += JOURNAL_CRC.size + length
+        if len(data) < position + JOURNAL_CRC.size or JOURNAL_CRC.unpack_from(data, position)[0] != zlib.crc32(info):
+            raise ValueError(f"{path} has a damaged header")
+        position += JOURNAL_CRC.size
+        info = json.loads(info.decode())
+        if not valid_transfer_id(info.get('transfer')):
+            raise ValueError(f"{path} has an invalid transfer id")
+        if not os.path.exists(os.path.join(save_dir, f".{info['transfer']}.part")):
+            raise ValueError(f"{path} has no partial file")
+        ranges = []
+        record_size = JOURNAL_RANGE.size + JOURNAL_CRC.size
+        while position + record_size <= len(data):
+            record = data[position:position + JOURNAL_RANGE.size]
+            if JOURNAL_CRC.unpack_from(data, position + JOURNAL_RANGE.size)[0] != zlib.crc32(record):
+                break  # Torn by a crash while appending
+            ranges.append(list(JOURNAL_RANGE.unpack(record)))
+            position += record_size
+        # Drop a torn tail so new records follow the last good one
+        os.truncate(path, position)
+        repair = tuple(info['repair']) if info.get('repair') else None
+        return cls(save_dir, info['transfer'], info['name'], info['size'], repair, ranges=ranges)
+
+    def add(self, offset, data):
+        if offset in self.pending:
+            return
+        self.pending[offset] = data
+        self.pending_size += len(data)
+        if self.pending_size >= WRITE_EXTENT:
+            self.flush()
+
+    def _write_at(self, offset, buffers):
+        index = 0
+        while index < len(buffers):
+            if hasattr(os, 'pwritev'):
+                written = os.pwritev(self.fd, buffers[index:index + self.iov_max], offset)
+            else:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                written = os.write(self.fd, buffers[index])
+            offset += written
+            # Skip what was written, keep the tail of a partly written buffer
+            while index < len(buffers) and written >= len(buffers[index]):
+                written -= len(buffers[index])
+                index += 1
+            if written:
+                buffers[index] = memoryview(buffers[index])[written:]
+
+    def flush(self):
+        if not self.pending:
+            return
+        # Coalesce adjacent chunks into runs, one pwritev and one record per run
+        runs = []  # [offset, buffers, length]
+        for offset in sorted(self.pending):
+            data = self.pending[offset]
+            if runs and runs[-1][0] + runs[-1][2] == offset:
+                runs[-1][1].append(data)
+                runs[-1][2] += len(data)
+            else:
+                runs.append([offset, [data], len(data)])
+        self.pending = {}
+        self.pending_size = 0
+        for offset, buffers, length in runs:
+            self._write_at(offset, buffers)
+            record = JOURNAL_RANGE.pack(offset, length)
+            self.records.append(record + JOURNAL_CRC.pack(zlib.crc32(record)))
+            self.ranges.append([offset, length])
+            self.unsynced += length
+        if self.durability != 'periodic' or self.unsynced >= SYNC_INTERVAL:
+            self._commit()
+
+    def _commit(self):
+        # The data must be on disk before the records that describe it
+        if self.durability == 'periodic' and self.unsynced:
+            self._sync()
+        if self.records:
+            self.journal.write(b''.join(self.records))
+            self.records = []
+
+    def _sync(self):
+        if hasattr(os, 'fdatasync'):
+            os.fdatasync(self.fd)
+        else:
+            os.fsync(self.fd)
+        self.unsynced = 0
+
+    def holes(self):
+        # [offset, length] ranges of the file that are not on disk yet
+        self.flush()
+        holes = []
+        position = 0
+        for offset, length in sorted(self.ranges):
+            if offset > position:
+                holes.append([position, offset - position])
+            position = max(position, offset + length)
+        if position < self.size:
+            holes.append([position, self.size - position])
+        return holes
+
+    def publish(self, save_path):
+        # Like ExtentWriter.publish; the journal goes once the file is in place
+        try:
+            self.flush()
+            if self.durability != 'none' and self.unsynced:
+                self._sync()
+        finally:
+            self.close()
+        os.replace(self.part_path, save_path)
+        if self.durability != 'none':
+            fsync_directory(save_path)
+        os.remove(self.path)
+        return save_path
+
+    def close(self):
+        # Keeps both files, a later run resumes from them
+        if self.fd is not None:
+            try:
+                self.flush()
+                self._commit()
+            finally:
+                os.close(self.fd)
+                self.fd = None
+                self.journal.close()
+
+class LossHistory:
+    # Loss event rate estimated the way TFRC receivers do (RFC 5348, section 5.4):
+    # the weighted mean of the last few intervals between losses, where a gap in
+    # a stripe's chunk counter counts as one loss event. Reported to the sender in ACKs.
+    WEIGHTS = (1.0, 1.0, 1.0, 1.0, 0.8, 0.6, 0.4, 0.2)
+
+    def __init__(self):
+        self.highest = None
+        self.intervals = deque(maxlen=len(self.WEIGHTS))  # Closed intervals, newest first
+        self.current = 0  # Packets since the last loss event
+
+    def observe(self, seq_num):
+        # Only first transmissions move the estimate, repairs fill old gaps
+        if self.highest is not None and seq_num <= self.highest:
+            return
+        if self.highest is not None and seq_num > self.highest + 1:
+            self.intervals.appendleft(self.current)
+            self.current = 0
+        self.highest = seq_num
+        self.current += 1
+
+    def loss_rate(self):
+        if not self.intervals:
+            return 0.0
+        closed = list(self.intervals)
+        weights = self.WEIGHTS[:len(closed)]
+        total = sum(interval * weight for interval, weight in zip(closed, weights))
+        # The open interval counts once it is long enough to lower the rate
+        with_current = sum(interval * weight for interval, weight in zip([self.current] + closed, weights))
+        return sum(weights) / max(total, with_current, 1)
+
+class ReliableMulticastReceiver:
+    def __init__(self, multicast_group, port, receiver_id, save_dir='received_files', on_message=None, open_socket=True, profiler=None, trace=None, on_event=None,
+                 interfaces=None, stripes=1):
+        self.multicast_group = multicast_group
+        self.port = port
+        self.receiver_id = receiver_id
+        self.save_dir = save_dir
+        # Per-stage timers, off unless MUCAST_PROFILE is set
+        self.profiler = profiler or StageProfiler.from_env(f'receiver_{receiver_id}')
+        # Called as on_message(text, addr) for every message on the message channel
+        self.on_message = on_message or self._print_message
+        # Called as on_event(event, info) for file transfers: started, progress,
+        # completed, failed, resumed; progress at most once per progress_interval seconds
+        self.on_event = on_event or self._print_event
+        self.progress_interval = 0.5
+        
+        # Create UDP socket (shard workers get their packets from a reader instead)
+        self.sock = None
+        if open_socket:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(('', port))
+            
+            # Join the multicast group on every interface, or each stripe of a striped
+            # sender on its interface; the stripes all arrive on this one socket
+            join_groups(self.sock, multicast_group, stripes, interfaces)
+        
+        # Create save directory
+        if not os.path.exists(save_dir):
+            os.makedirs(save_dir)
+        
+        # Same-host senders may hand us files through SPOOL_DIR; set local_spool to
+        # False to always receive over multicast
+        self.local_spool = True
+        self.host_token = None  # Read from SPOOL_DIR once a local sender has written it
+        self.spool_failed = deque(maxlen=SPOOL_FAILURES)
+        
+        # Fetch the byte ranges still missing at DONE from the sender's repair server
+        self.tcp_repair = True
+        # Keep incoming transfers in an on-disk journal so a restart only tops them up
+        self.resume = True
+        self.resumed = set()  # Transfers loaded from a journal and not finished yet
+        
+        # One long-lived socket for all ACKs back to the sender
+        self.ack_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        
+        # Record every datagram in and out to a packet trace for offline replay
+        if trace:
+            if self.sock:
+                self.sock = TracingSocket(self.sock, trace)
+            self.ack_sock = TracingSocket(self.ack_sock, trace)
+        
+        # ACK batching: acknowledge every ack_every packets or after ack_interval seconds
+        self.ack_every = 16
+        self.ack_interval = 0.05
+        self.ack_target = None  # (sender address, ack port)
+        self.unacked_packets = 0
+        self.last_ack_time = 0
+        # An ACK is repeated at least this often so the sender keeps us in its membership
+        self.heartbeat_interval = 1.0
+        
+        # Initialize state
+        self.sequence_source = None  # Sender session the sequence state belongs to
+        self.cumulative_ack = -1  # Highest contiguous sequence number received
+        self.sequence_numbers = set()  # Received sequence numbers above cumulative_ack
+        # Loss history per stripe, kept from the chunks' 'lane' counters (see _observe_loss);
+        # stripes drift apart, so only within one of them is a gap a loss
+        self.loss = {}
+        self.file_queue = queue.Queue()
+        # Concurrent file transfers by transfer id: {'name', 'size', 'chunks': {offset: hex}, 'received'}
+        self.transfers = {}
+        self.received_size = 0  # Total file bytes received, reported in ACKs
+        self.text_chunks = []
+        self.expected_chunks = 0
+        
+        # Message channel state, separate from the file sequence space
+        self.message_source = None
+        self.message_highest = None
+        self.missing_messages = set()
+        
+        # Counters, see get_stats()
+        self.stats = {'packets': 0, 'duplicates': 0, 'checksum_errors': 0, 'bytes': 0, 'files_saved': 0, 'repaired_bytes': 0}
+        
+        # Start file processing thread
+        self.processor_thread = threading.Thread(target=self._process_files)
+        self.processor_thread.daemon = True
+        self.processor_thread.start()
+        
+        if open_socket:
+            print(f"Receiver {receiver_id} listening on {multicast_group}:{port}")
+
+    def _record_sequence(self, seq_num):
+        # Returns False for duplicates, otherwise advances the cumulative ACK
+        if seq_num <= self.cumulative_ack or seq_num in self.sequence_numbers:
+            return False
+        self.sequence_numbers.add(seq_num)
+        while self.cumulative_ack + 1 in self.sequence_numbers:
+            self.cumulative_ack += 1
+            self.sequence_numbers.discard(self.cumulative_ack)
+        return True
+
+    def _send_ack(self):
+        try:
+            # Bit i of the bitmap acknowledges cumulative_ack + 1 + i
+            bitmap = 0
+            for seq_num in self.sequence_numbers:
+                offset = seq_num - self.cumulative_ack - 1
+                if offset < 64:
+                    bitmap |= 1 << offset
+            ack_data = {
+                'type': 'ACK',
+                'receiver_id': self.receiver_id,
+                'cumulative': self.cumulative_ack,
+                'bitmap': bitmap,
+                'bytes': self.received_size,
+                'msg_highest': self.message_highest,
+                'loss': round(max((history.loss_rate() for history in self.loss.values()), default=0.0), 6)
+            }
+            if self.local_spool:
+                if self.host_token is None:
+                    self.host_token = read_host_token()
+                if self.host_token:
+                    ack_data['host'] = self.host_token
+            if self.spool_failed:
+                ack_data['spool_failed'] = list(self.spool_failed)
+            self.ack_sock.sendto(json.dumps(ack_data).encode(), self.ack_target)
+            self.unacked_packets = 0
+            self.last_ack_time = time.time()
+        except Exception as e:
+            print(f"Error sending ACK: {e}")
+
+    def _schedule_ack(self, force=False):
+        self.unacked_packets += 1
+        if force or self.unacked_packets >= self.ack_every or time.time() - self.last_ack_time >= self.ack_interval:
+            started = self.profiler.start()
+            self._send_ack()
+            self.profiler.stop('ack_send', started)
+
+    def _print_message(self, text, addr):
+        print(f"\n[Receiver {self.receiver_id}] Text Message: {text}")
+
+    def _print_event(self, event, info):
+        if event == 'started':
+            print(f"\n[Receiver {self.receiver_id}] Receiving file: {info['name']} ({info['size']} bytes)")
+        elif event == 'progress':
+            print(f"[Receiver {self.receiver_id}] Progress: {info['received']}/{info['size']} bytes", end='\r')
+        elif event == 'completed':
+            print(f"\n[Receiver {self.receiver_id}] File {os.path.basename(info['path'])} saved successfully!")
+        elif event == 'failed':
+            print(f"\n[Receiver {self.receiver_id}] Error saving file {info['name']}: {info['error']}")
+        elif event == 'resumed':
+            print(f"\n[Receiver {self.receiver_id}] Resuming file: {info['name']} ({info['received']}/{info['size']} bytes on disk)")
+
+    def _emit(self, event, info):
+        try:
+            self.on_event(event, info)
+        except Exception as e:
+            print(f"[Receiver {self.receiver_id}] Error in event callback: {e}")
+
+    def _send_message_nack(self):
+        try:
+            nack = {'type': 'MSG_NACK', 'receiver_id': self.receiver_id, 'missing': sorted(self.missing_messages)[:256]}
+            self.ack_sock.sendto(json.dumps(nack).encode(), self.ack_target)
+        except Exception as e:
+            print(f"Error sending MSG_NACK: {e}")
+
+    def _handle_message(self, packet, addr):
+        received_checksum = packet.pop('checksum')
+        if received_checksum != hashlib.md5(str(packet).encode()).hexdigest():
+            print(f"[Receiver {self.receiver_id}] Checksum mismatch for message {packet['msg_sequence']}")
+            return
+        
+        msg_seq = packet['msg_sequence']
+        source = (addr[0], packet['ack_port'])
+        self.ack_target = source
+        if source != self.message_source:
+            self.message_source = source
+            self.message_highest = msg_seq - 1
+            self.missing_messages = set()
+        
+        # Drop duplicates, NACK gaps right away instead of waiting for the heartbeat
+        if msg_seq <= self.message_highest and msg_seq not in self.missing_messages:
+            return
+        if msg_seq > self.message_highest + 1:
+            self.missing_messages.update(range(max(self.message_highest + 1, msg_seq - 256), msg_seq))
+            self._send_message_nack()
+        self.missing_messages.discard(msg_seq)
+        self.message_highest = max(self.message_highest, msg_seq)
+        
+        for text in packet['messages']:
+            self.on_message(text, addr)
+
+    def _process_files(self):
+        while True:
+            try:
+                file_data = self.file_queue.get()
+                if file_data is None:
+                    break
+                    
+                transfer_id, file_name, file_size, data_chunks, repair = file_data
+                spool = None
+                journal = None
+                if isinstance(data_chunks, TransferJournal):
+                    journal = data_chunks
+                elif not isinstance(data_chunks, dict):
+                    # Spooled transfer: an open file, mapped instead of copied
+                    spool = data_chunks
+                
+                # Get unique filename
+                unique_filename = get_unique_filename(self.save_dir, file_name)
+                save_path = os.path.join(self.save_dir, unique_filename)
+                info = {'transfer': transfer_id, 'name': file_name, 'size': file_size}
+                
+                started = self.profiler.start()
+                writer = None
+                try:
+                    if journal:
+                        holes = journal.holes()
+                        if holes and repair and self.tcp_repair:
+                            self._repair(transfer_id, file_name, holes, repair, journal.add)
+                            holes = journal.holes()
+                        if holes:
+                            missing = sum(length for offset, length in holes)
+                            raise IOError(f"{missing} bytes missing, kept {os.path.basename(journal.path)} to resume")
+                        journal.publish(save_path)
+                    else:
+                        writer = ExtentWriter(self.save_dir)
+                        if spool:
+                            if file_size:
+                                with mmap.mmap(spool.fileno(), file_size, access=mmap.ACCESS_READ) as mapped:
+                                    with memoryview(mapped) as view:
+                                        for offset in range(0, file_size, WRITE_EXTENT):
+                                            writer.write(view[offset:offset + WRITE_EXTENT])
+                                        writer._flush()
+                        else:
+                            if repair and self.tcp_repair:
+                                holes = self._find_holes(file_size, data_chunks)
+                                if holes:
+                                    self._repair(transfer_id, file_name, holes, repair, data_chunks.__setitem__)
+                            # Chunks may arrive out of order under windowing, write them in offset order
+                            for offset in sorted(data_chunks):
+                                chunk = data_chunks[offset]
+                                writer.write(bytes.fromhex(chunk) if isinstance(chunk, str) else chunk)
+                        writer.publish(save_path)
+                except Exception as e:
+                    if writer:
+                        writer.abort()
+                    if journal:
+                        journal.close()
+                    self._emit('failed', dict(info, error=str(e)))
+                    raise
+                finally:
+                    if spool:
+                        spool.close()
+                self.profiler.stop('disk_write', started)
+                
+                self._emit('completed', dict(info, path=save_path))
+                self.stats['files_saved'] += 1
+                
+                self.file_queue.task_done()
+                
+            except Exception as e:
+                print(f"[Receiver {self.receiver_id}] Error processing file: {e}")
+
+    def _find_holes(self, file_size, data_chunks):
+        # [offset, length] ranges of the file not covered by any chunk
+        holes = []
+        position = 0
+        for offset in sorted(data_chunks):
+            if offset > position:
+                holes.append([position, offset - position])
+            position = max(position, offset + len(data_chunks[offset]) // 2)
+        if position < file_size:
+            holes.append([position, file_size - position])
+        return holes
+
+    def _fetch_ranges(self, address, transfer_id, ranges, store):
+        # Point-to-point request to the sender's repair server; the data is passed to
+        # store(offset, data) in blocks of at most WRITE_EXTENT as it is read.
+        # Returns the number of bytes received
+        received = 0
+        with socket.create_connection(address, timeout=REPAIR_TIMEOUT) as conn:
+            conn.sendall(json.dumps({'transfer': transfer_id, 'ranges': ranges}).encode() + b'\n')
+            with conn.makefile('rb') as reader:
+                for _ in ranges:
+                    header = reader.read(REPAIR_HEADER.size)
+                    if len(header) < REPAIR_HEADER.size:
+                        raise ConnectionError("repair server closed the connection")
+                    offset, length = REPAIR_HEADER.unpack(header)
+                    while length > 0:
+                        data = reader.read(min(length, WRITE_EXTENT))
+                        if not data:
+                            raise ConnectionError("repair server closed the connection")
+                        store(offset, data)
+                        offset += len(data)
+                        length -= len(data)
+                        received += len(data)
+        return received
+
+    def _repair(self, transfer_id, file_name, holes, address, store):
+        # Fetches the holes into store(offset, data), see _fetch_ranges; whatever the
+        # repair server cannot send stays missing
+        pieces = [[offset + start, min(REPAIR_PIECE, length - start)]
+                  for offset, length in holes for start in range(0, length, REPAIR_PIECE)]
+        try:
+            repaired = self._fetch_ranges(address, transfer_id, pieces, store)
+        except Exception as e:
+            print(f"[Receiver {self.receiver_id}] Error repairing {file_name}: {e}")
+            return
+        self.stats['repaired_bytes'] += repaired
+        print(f"[Receiver {self.receiver_id}] Repaired {len(holes)} missing range(s), {repaired} bytes of {file_name} over TCP")
+
+    def resume_transfers(self, index=0, count=1):
+        # Pick up the journals a previous run left in save_dir; shard workers take
+        # only the transfers that hash to them
+        for entry in sorted(os.listdir(self.save_dir)):
+            if not (entry.startswith('.') and entry.endswith('.journal')):
+                continue
+            transfer_id = entry[1:-len('.journal')]
+            if not valid_transfer_id(transfer_id):
+                continue
+            if zlib.crc32(transfer_id.encode()) % count != index:
+                continue
+            try:
+                journal = TransferJournal.load(self.save_dir, os.path.join(self.save_dir, entry))
+            except Exception as e:
+                print(f"[Receiver {self.receiver_id}] Error loading journal {entry}: {e}")
+                continue
+            received = journal.size - sum(length for offset, length in journal.holes())
+            self.transfers[transfer_id] = {'name': journal.name, 'size': journal.size, 'chunks': {}, 'received': received,
+                                           'last_progress': 0, 'last_packet': time.time(), 'journal': journal}
+            if journal.repair:
+                self.transfers[transfer_id]['repair'] = journal.repair
+            self.resumed.add(transfer_id)
+            self._emit('resumed', {'transfer': transfer_id, 'name': journal.name, 'size': journal.size, 'received': received})
+
+    def _finish_resumed(self):
+        # The sender may have finished while we were down: once a resumed transfer
+        # goes quiet, complete it from the repair server
+        now = time.time()
+        for transfer_id in list(self.resumed):
+            transfer = self.transfers.get(transfer_id)
+            if transfer is None:
+                self.resumed.discard(transfer_id)
+            elif now - transfer['last_packet'] >= RESUME_IDLE:
+                self.resumed.discard(transfer_id)
+                del self.transfers[transfer_id]
+                self.file_queue.put((transfer_id, transfer['name'], transfer['size'], transfer['journal'], transfer.get('repair')))
+
+    def _skip_sequences(self, ranges):
+        # The sender stopped waiting for us on these sequence numbers
+        for first, last in ranges:
+            for seq_num in range(first, last + 1):
+                self._record_sequence(seq_num)
+        if self.ack_target:
+            self._send_ack()
+
+    def _verify_checksum(self, packet):
+        started = self.profiler.start()
+        received_checksum = packet.pop('checksum')
+        calculated_checksum = hashlib.md5(str(packet).encode()).hexdigest()
+        self.profiler.stop('checksum', started)
+        if received_checksum != calculated_checksum:
+            print(f"[Receiver {self.receiver_id}] Checksum mismatch for packet {packet.get('sequence')}")
+            self.stats['checksum_errors'] += 1
+            return False
+        return True
+
+    def _track_session(self, seq_num, addr, ack_port):
+        # ACK the sender's real source address; a new ack port means a new sender session
+        self.ack_target = (addr[0], ack_port)
+        if self.ack_target != self.sequence_source:
+            self.sequence_source = self.ack_target
+            self.cumulative_ack = seq_num - 1
+            self.sequence_numbers = set()
+            self.loss = {}
+            return True
+        return False
+
+    def _observe_loss(self, lane):
+        # lane is [stripe, chunk counter of that stripe], set on file chunks
+        if not lane:
+            return
+        history = self.loss.get(lane[0])
+        if history is None:
+            history = self.loss[lane[0]] = LossHistory()
+        history.observe(lane[1])
+
+    def _is_duplicate(self, seq_num):
+        return seq_num <= self.cumulative_ack or seq_num in self.sequence_numbers
+
+    def _handle_packet(self, packet_data, addr):
+        try:
+            # Parse packet
+            started = self.profiler.start()
+            packet = json.loads(packet_data.decode())
+            self.profiler.stop('decode', started)
+            self.stats['packets'] += 1
+            
+            # Messages have their own sequence space and never touch file state
+            if packet['type'] == 'MSG':
+                self._handle_message(packet, addr)
+                return
+            
+            # A file packet with a forged transfer id is dropped before it creates any state
+            if packet['type'] == 'FILE' and not valid_transfer_id(packet.get('transfer')):
+                print(f"[Receiver {self.receiver_id}] Dropping file packet with invalid transfer id {packet.get('transfer')!r}")
+                return
+            
+            seq_num = packet['sequence']
+            self._track_session(seq_num, addr, packet['ack_port'])
+            
+            # Check if we've already processed this sequence number
+            if self._is_duplicate(seq_num):
+                # A retransmission means our last ACK was lost, answer right away
+                self.stats['duplicates'] += 1
+                self._schedule_ack(force=True)
+                return
+            
+            # Verify checksum
+            if not self._verify_checksum(packet):
+                return
+            
+            # Add sequence number to processed set
+            self._observe_loss(packet.get('lane'))
+            self._record_sequence(seq_num)
+            
+            # Send ACK. File info is applied first, so a spool that fails to open is
+            # already reported in the ACK that covers it
+            info = isinstance(packet['data'], dict)
+            if info:
+                self._apply_packet(packet, seq_num, addr)
+            self._schedule_ack(force=packet.get('ack_now', False))
+            
+            if not info:
+                self._apply_packet(packet, seq_num, addr)
+            
+        except Exception as e:
+            print(f"[Receiver {self.receiver_id}] Error handling packet: {e}")
+
+    def _apply_packet(self, packet, seq_num, addr):
+        # Handle packet based on type
+        if packet['type'] == 'FILE':
+            transfer_id = packet.get('transfer')
+            transfer = self.transfers.get(transfer_id)
+            if isinstance(packet['data'], dict):  # File info
+                if transfer and 'journal' in transfer:
+                    return  # Already resumed from its journal
+                if transfer and transfer.get('spool'):
+                    transfer['spool'].close()  # The sender fell back to multicast
+                self.transfers[transfer_id] = {'name': packet['data']['name'], 'size': packet['data']['size'], 'chunks': {}, 'received': 0, 'last_progress': 0}
+                self._emit('started', {'transfer': transfer_id, 'name': packet['data']['name'], 'size': packet['data']['size']})
+                if 'spool' in packet['data']:
+                    # Open now: the sender removes the spool once DONE is acknowledged.
+                    # Without local_spool no spool is accepted and the sender is told
+                    # to multicast the file instead
+                    try:
+                        if not self.local_spool:
+                            raise ValueError("local spool disabled")
+                        self.transfers[transfer_id]['spool'] = open_spool(packet['data']['spool'], transfer_id)
+                    except (OSError, ValueError) as e:
+                        print(f"[Receiver {self.receiver_id}] Error opening spool: {e}")
+                        self.transfers[transfer_id]['spool'] = None
+                        self._reject_spool(transfer_id)
+                if 'repair_port' in packet['data']:
+                    self.transfers[transfer_id]['repair'] = (addr[0], packet['data']['repair_port'])
+                if self.resume and 'spool' not in packet['data']:
+                    self.transfers[transfer_id]['journal'] = TransferJournal(self.save_dir, transfer_id, packet['data']['name'], packet['data']['size'],
+                                                                             self.transfers[transfer_id].get('repair'))
+            elif packet['data'] == "DONE":  # End of file
+                repair = packet.get('repair')
+                if repair and self.receiver_id in repair['receivers']:
+                    # We fell too far behind: the rest comes from the repair server
+                    self._skip_sequences(repair['sequences'])
+                if transfer:
+                    self.resumed.discard(transfer_id)
+                    if 'journal' in transfer:
+                        self.file_queue.put((transfer_id, transfer['name'], transfer['size'], transfer['journal'], transfer.get('repair')))
+                    elif 'spool' not in transfer:
+                        self.file_queue.put((transfer_id, transfer['name'], transfer['size'], transfer['chunks'], transfer.get('repair')))
+                    elif transfer['spool']:
+                        self.received_size += transfer['size']
+                        self.stats['bytes'] += transfer['size']
+                        self.file_queue.put((transfer_id, transfer['name'], transfer['size'], transfer['spool'], None))
+                    else:
+                        self._emit('failed', {'transfer': transfer_id, 'name': transfer['name'], 'size': transfer['size'], 'error': "spool unavailable"})
+                    del self.transfers[transfer_id]
+            else:  # File chunk
+                if transfer:
+                    if 'journal' in transfer and 'offset' in packet:
+                        started = self.profiler.start()
+                        transfer['journal'].add(packet['offset'], bytes.fromhex(packet['data']))
+                        self.profiler.stop('journal_write', started)
+                    else:
+                        transfer['chunks'][packet.get('offset', seq_num)] = packet['data']
+                    transfer['received'] += len(packet['data']) // 2
+                    self.received_size += len(packet['data']) // 2
+                    self.stats['bytes'] += len(packet['data']) // 2
+                    now = time.time()
+                    transfer['last_packet'] = now
+                    if now - transfer['last_progress'] >= self.progress_interval:
+                        transfer['last_progress'] = now
+                        self._emit('progress', {'transfer': transfer_id, 'name': transfer['name'], 'size': transfer['size'], 'received': transfer['received']})
+        
+        elif packet['type'] == 'TEXT':
+            if not self.expected_chunks:  # First packet contains chunk count
+                self.expected_chunks = int(packet['data'])
+                self.text_chunks = []
+            else:  # Text chunk
+                self.text_chunks.append(packet['data'])
+                if len(self.text_chunks) == self.expected_chunks:
+                    complete_text = ''.join(self.text_chunks)
+                    self.on_message(complete_text, addr)
+                    self.text_chunks = []
+                    self.expected_chunks = 0
+
+    def _reject_spool(self, transfer_id):
+        # Reported in every ACK from now on, see SPOOL_FAILURES
+        self.spool_failed.append(transfer_id)
+
+    def _on_idle(self):
+        if self.ack_target and (self.unacked_packets or time.time() - self.last_ack_time >= self.heartbeat_interval):
+            # Still-missing messages are NACKed again along with the heartbeat
+            if self.missing_messages:
+                self._send_message_nack()
+            self._send_ack()
+
+    def _shutdown(self):
+        # Tell the sender we are gone so it does not wait for us
+        if self.ack_target:
+            try:
+                self.ack_sock.sendto(json.dumps({'type': 'LEAVE', 'receiver_id': self.receiver_id}).encode(), self.ack_target)
+            except Exception as e:
+                print(f"Error sending LEAVE: {e}")
+        self.file_queue.put(None)
+        self.processor_thread.join()
+        # Unfinished transfers stay on disk for the next run
+        for transfer in self.transfers.values():
+            if 'journal' in transfer:
+                transfer['journal'].close()
+        if self.sock:
+            self.sock.close()
+        self.ack_sock.close()
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    def replay(self, trace_path, realtime=False, speed=1.0):
+        # Feed a recorded trace straight into the packet handler, nothing goes on the network
+        self.ack_sock.close()
+        self.ack_sock = NullSocket()
+        self.tcp_repair = False  # The recorded sender is gone
+        self.resume = False
+        try:
+            summary = replay_trace(trace_path, self._handle_packet, realtime, speed)
+        finally:
+            self._shutdown()
+        summary['stats'] = self.get_stats()
+        return summary
+
+    def start(self):
+        # Wake up periodically to flush batched ACKs when traffic pauses
+        self.sock.settimeout(self.ack_interval)
+        if self.resume:
+            self.resume_transfers()
+        try:
+            while True:
+                if self.resumed:
+                    self._finish_resumed()
+                started = self.profiler.start()
+                try:
+                    data, addr = self.sock.recvfrom(65535)  # Increased buffer size
+                except socket.timeout:
+                    self._on_idle()
+                    continue
+                self.profiler.stop('recv_wait', started)
+                self._handle_packet(data, addr)
+        except Exception as e:
+            print(f"[Receiver {self.receiver_id}] Error receiving data: {e}")
+        finally:
+            self._shutdown()
+
+def _peek_header(packet_data):
+    # Everything before "data" is the routing header (the sender puts data last)
+    end = packet_data.find(b', "data": ')
+    if end < 0:
+        return None
+    try:
+        return json.loads(packet_data[:end] + b'}')
+    except ValueError:
+        return None
+
+def _shard_worker(multicast_group, port, receiver_id, save_dir, inbox, results, index, progress_interval=0.5, workers=1, resume=True, local_spool=True, tcp_repair=True):
+    # Parses, verifies and stores the file packets of the transfers in this shard,
+    # and reports each sequence number and transfer event back to the reader
+    profiler = StageProfiler.from_env(f'receiver_{receiver_id}_worker{index}')
+    receiver = ReliableMulticastReceiver(multicast_group, port, receiver_id, save_dir, open_socket=False, profiler=profiler,
+                                         on_event=lambda event, info: results.put(('event', event, info)))
+    receiver.progress_interval = progress_interval
+    # Skipped sequence numbers belong to the reader's ACK state
+    receiver._skip_sequences = lambda ranges: results.put(('skip', ranges))
+    receiver._reject_spool = lambda transfer_id: results.put(('spool_failed', transfer_id))
+    receiver.resume = resume
+    receiver.local_spool = local_spool
+    receiver.tcp_repair = tcp_repair
+    if resume:
+        receiver.resume_transfers(index, workers)
+    last_report = time.time()
+    try:
+        while True:
+            if receiver.resumed:
+                receiver._finish_resumed()
+            try:
+                item = inbox.get(timeout=1.0)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                seq_num, packet_data, addr = item
+                try:
+                    started = profiler.start()
+                    packet = json.loads(packet_data.decode())
+                    profiler.stop('decode', started)
+                    receiver.stats['packets'] += 1
+                    if receiver._verify_checksum(packet):
+                        received_before = receiver.received_size
+                        receiver._apply_packet(packet, seq_num, addr)
+                        results.put(('ok', seq_num, packet.get('ack_now', False), receiver.received_size - received_before))
+                    else:
+                        results.put(('bad', seq_num))
+                except Exception as e:
+                    print(f"[Receiver {receiver_id}] Worker {index} error handling packet: {e}")
+                    results.put(('bad', seq_num))
+            if time.time() - last_report >= 1.0:
+                results.put(('stats', index, receiver.get_stats()))
+                last_report = time.time()
+    except KeyboardInterrupt:
+        pass
+    receiver._shutdown()
+    # Worker processes skip atexit, so dump the profile here
+    profiler.close()
+    results.put(('stats', index, receiver.get_stats()))
+
+class ShardedReliableReceiver(ReliableMulticastReceiver):
+    # One reader receives, deduplicates and ACKs; file packets are fanned out to
+    # worker processes by transfer id for JSON parsing, checksums and disk writes.
+    # SO_REUSEPORT cannot shard multicast: every socket bound to the group port
+    # gets its own copy of each datagram, so the fan-out happens here instead.
+    def __init__(self, multicast_group, port, receiver_id, save_dir='received_files', on_message=None, workers=2, profiler=None, trace=None, on_event=None,
+                 interfaces=None, stripes=1):
+        super().__init__(multicast_group, port, receiver_id, save_dir, on_message, profiler=profiler, trace=trace, on_event=on_event,
+                         interfaces=interfaces, stripes=stripes)
+        self.workers = workers
+        self.state_lock = threading.Lock()
+        self.forwarded = set()  # Sequence numbers handed to a worker and not yet confirmed
+        self.worker_stats = {}
+
+    def _collect_results(self, results):
+        while True:
+            result = results.get()
+            if result is None:
+                break
+            if result[0] == 'event':
+                # File events from a worker go to this receiver's subscriber
+                self._emit(result[1], result[2])
+                continue
+            with self.state_lock:
+                if result[0] == 'ok':
+                    kind, seq_num, ack_now, size = result
+                    self.forwarded.discard(seq_num)
+                    self._record_sequence(seq_num)
+                    self.received_size += size
+                    self._schedule_ack(force=ack_now)
+                elif result[0] == 'spool_failed':
+                    # Comes before the 'ok' of its FILE_INFO, so the ACK carries it
+                    self.spool_failed.append(result[1])
+                elif result[0] == 'skip':
+                    for first, last in result[1]:
+                        for seq_num in range(first, last + 1):
+                            self._record_sequence(seq_num)
+                elif result[0] == 'bad':
+                    # Not ACKed, so the retransmission will be accepted
+                    self.forwarded.discard(result[1])
+                else:
+                    self.worker_stats[result[1]] = result[2]
+
+    def get_stats(self):
+        # Reader counters merged with the latest report of every worker
+        merged = dict(self.stats)
+        for stats in list(self.worker_stats.values()):
+            for key, value in stats.items():
+                merged[key] += value
+        return merged
+
+    def start(self):
+        inboxes = [multiprocessing.Queue() for _ in range(self.workers)]
+        results = multiprocessing.Queue()
+        processes = []
+        for index in range(self.workers):
+            process = multiprocessing.Process(target=_shard_worker, args=(self.multicast_group, self.port, self.receiver_id, self.save_dir, inboxes[index], results, index, self.progress_interval, self.workers, self.resume, self.local_spool, self.tcp_repair))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+        collector_thread = threading.Thread(target=self._collect_results, args=(results,))
+        collector_thread.daemon = True
+        collector_thread.start()
+        print(f"[Receiver {self.receiver_id}] Sharding file transfers across {self.workers} workers")
+        
+        self.sock.settimeout(self.ack_interval)
+        try:
+            while True:
+                started = self.profiler.start()
+                try:
+                    data, addr = self.sock.recvfrom(65535)
+                except socket.timeout:
+                    with self.state_lock:
+                        self._on_idle()
+                    continue
+                self.profiler.stop('recv_wait', started)
+                
+                # Messages, text and anything without a transfer id are handled here
+                header = _peek_header(data)
+                if not header or header.get('type') != 'FILE' or not valid_transfer_id(header.get('transfer')):
+                    with self.state_lock:
+                        self._handle_packet(data, addr)
+                    continue
+                
+                seq_num = header['sequence']
+                with self.state_lock:
+                    if self._track_session(seq_num, addr, header['ack_port']):
+                        self.forwarded = set()
+                    if self._is_duplicate(seq_num):
+                        self.stats['duplicates'] += 1
+                        self._schedule_ack(force=True)
+                        continue
+                    if seq_num in self.forwarded:
+                        self.stats['duplicates'] += 1
+                        continue
+                    self.forwarded.add(seq_num)
+                    # Loss is judged in arrival order, before the workers reorder results
+                    self._observe_loss(header.get('lane'))
+                
+                shard = zlib.crc32(header['transfer'].encode()) % self.workers
+                inboxes[shard].put((seq_num, data, addr))
+        except Exception as e:
+            print(f"[Receiver {self.receiver_id}] Error receiving data: {e}")
+        finally:
+            for inbox in inboxes:
+                inbox.put(None)
+            for process in processes:
+                process.join()
+            results.put(None)
+            collector_thread.join()
+            print(f"[Receiver {self.receiver_id}] Stats: {self.get_stats()}")
+            self._shutdown()
+
+def main(receiver_id):
+    # Command line entry point of RecieverB/C/D.py, which differ only in receiver_id
+    parser = argparse.ArgumentParser(description="Reliable Multicast Receiver")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes to shard file transfers across")
+    parser.add_argument('--profile', action='store_true', help="record per-stage timings (same as MUCAST_PROFILE=stages)")
+    parser.add_argument('--record', metavar='TRACE', help="record every datagram to a packet trace file")
+    parser.add_argument('--replay', metavar='TRACE', help="replay a packet trace offline instead of listening")
+    parser.add_argument('--realtime', action='store_true', help="replay at the recorded timing instead of as fast as possible")
+    parser.add_argument('--speed', type=float, default=1.0, help="timing multiplier for --realtime")
+    parser.add_argument('--durability', choices=['none', 'end', 'periodic'], default=DURABILITY, help="when saved files are synced to disk")
+    parser.add_argument('--progress-interval', type=float, default=0.5, help="seconds between progress updates per transfer")
+    parser.add_argument('--no-spool', action='store_true', help="do not accept files through the local spool from a sender on this host")
+    parser.add_argument('--no-resume', action='store_true', help="keep incoming files in memory only, without a transfer journal")
+    parser.add_argument('--interface', action='append', metavar='ADDRESS', help="local IPv4 address of an interface to join on, repeat for several")
+    parser.add_argument('--stripes', type=int, default=1, help="join the groups of a sender striping over this many groups")
+    parser.add_argument('--quiet', action='store_true', help="do not print file transfer events")
+    args = parser.parse_args()
+    set_durability(args.durability)
+    
+    # Multicast configuration
+    MULTICAST_GROUP = '224.3.29.71'
+    PORT = 10000
+    
+    # Receiver identification
+    RECEIVER_ID = receiver_id
+    
+    # The save directory
+    SAVE_DIR = f'received_files_Receiver_{RECEIVER_ID}'
+    
+    print(f"Starting Receiver {RECEIVER_ID}...")
+    profiler = StageProfiler.from_env(f'receiver_{RECEIVER_ID}', args.profile)
+    on_event = (lambda event, info: None) if args.quiet else None
+    if args.replay:
+        receiver = ReliableMulticastReceiver(MULTICAST_GROUP, PORT, RECEIVER_ID, SAVE_DIR, open_socket=False, profiler=profiler, on_event=on_event)
+        receiver.progress_interval = args.progress_interval
+        summary = receiver.replay(args.replay, args.realtime, args.speed)
+        print(f"Receiver stats: {summary['stats']}")
+        sys.exit(0)
+    
+    trace = TraceWriter(args.record) if args.record else None
+    if args.workers > 1:
+        receiver = ShardedReliableReceiver(MULTICAST_GROUP, PORT, RECEIVER_ID, SAVE_DIR, workers=args.workers, profiler=profiler, trace=trace, on_event=on_event,
+                                            interfaces=args.interface, stripes=args.stripes)
+    else:
+        receiver = ReliableMulticastReceiver(MULTICAST_GROUP, PORT, RECEIVER_ID, SAVE_DIR, profiler=profiler, trace=trace, on_event=on_event,
+                                             interfaces=args.interface, stripes=args.stripes)
+    receiver.progress_interval = args.progress_interval
+    receiver.local_spool = not args.no_spool
+    receiver.resume = not args.no_resume
+    receiver.start() 
\ No newline at end of file
@@ -4,7 +4,71 @@ import time
 import os
 import threading
 import json
+import math
 import hashlib
+import argparse
+import shutil
+import tempfile
+import sys
+from collections import deque
+from StageProfiler import StageProfiler
+
+# Helpers shared with the multi-channel sender live one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PacketTrace import TraceWriter, TracingSocket, ROLE_SENDER
+from PacketCache import PacketCache, content_key, CACHE_BYTES
+from MulticastInterfaces import stripe_lanes, set_multicast_interface
+from FileReadAhead import FileReadAhead, READ_AHEAD_DEPTH
+
+# Local spool: when every receiver runs on this host the file is hard-linked into
+# SPOOL_DIR and receivers map it straight from the page cache instead of reading
+# it off the multicast socket. The sender keeps a random token in SPOOL_DIR/HOST_TOKEN
+# and receivers that can read it report it in their ACKs; unlike the hostname it
+# differs between cloned machines. Receivers that cannot open a spool list its
+# transfer under 'spool_failed' in their ACKs and the file is multicast instead.
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'mucast_spool')
+HOST_TOKEN = 'host_token'
+
+# TCP repair: receivers that fell too far behind on a transfer fetch the byte ranges
+# they miss point-to-point after DONE. Every range in a reply starts with
+# REPAIR_HEADER (offset, length); files stay available REPAIR_LINGER seconds after DONE.
+# Receivers ask for pieces of at most REPAIR_PIECE bytes, longer ranges are cut short
+REPAIR_HEADER = struct.Struct('!QI')
+REPAIR_LINGER = 60.0
+REPAIR_PIECE = 8 * 1024 * 1024
+
+# Congestion control: the pacing rate follows the slowest receiver's TCP-friendly
+# rate, computed from the loss event rate it reports and the RTT measured here.
+# Rates are in bytes per second, CC_PACKET_SIZE is a typical encoded chunk packet
+CC_PACKET_SIZE = 2200
+CC_MIN_RATE = 16 * 1024
+CC_MAX_RATE = 64 * 1024 * 1024
+
+# Message channel: a datagram of coalesced messages is at most MESSAGE_DATAGRAM bytes
+# once JSON-encoded, well below the 65507 bytes UDP allows. MESSAGE_HEADER is kept
+# free for the packet's other fields
+MESSAGE_DATAGRAM = 32000
+MESSAGE_HEADER = 256
+
+def local_host_token():
+    # Token in SPOOL_DIR, created on first use. It is written to a temporary file and
+    # linked into place, so receivers never read half a token and concurrent senders
+    # end up with the same one
+    path = os.path.join(SPOOL_DIR, HOST_TOKEN)
+    if not os.path.exists(path):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        token = os.urandom(16).hex()
+        temp_path = f"{path}.{token}"
+        with open(temp_path, 'w') as token_file:
+            token_file.write(token)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    with open(path) as token_file:
+        return token_file.read().strip()
 
 def get_filetype(file_name):
     if file_name.endswith('.html'):
@@ -26,22 +90,494 @@ def get_filetype(file_name):
     else:
         return "application/octet-stream"
 
+class ReceiverRegistry:
+    # Bounds for the per-receiver retransmission timeout, in seconds
+    MIN_RTO = 0.02
+    MAX_RTO = 2.0
+    # A member is badly behind when it misses at least this share of the packets in flight
+    EXCUSE_MISSING = 0.5
+
+    def __init__(self, timeout=5.0):
+        # Receivers that stay silent (no ACK or heartbeat) for timeout seconds are expired
+        self.timeout = timeout
+        self.members = {}  # receiver_id -> state dict
+        self.lock = threading.Lock()
+
+    def update(self, receiver_id, addr, cumulative=None, bitmap=0, bytes_complete=None, host=None, loss=None):
+        # Returns the member's previous cumulative ACK
+        now = time.time()
+        with self.lock:
+            member = self.members.get(receiver_id)
+            if member is None:
+                member = {'address': addr, 'joined': now, 'cumulative': -1, 'bitmap': 0, 'bytes_complete': 0,
+                          'srtt': None, 'rttvar': 0.0, 'rto': None, 'host': None, 'loss': 0.0, 'excused': set()}
+                self.members[receiver_id] = member
+                print(f"Receiver {receiver_id} {addr} joined")
+            previous = member['cumulative']
+            member['address'] = addr
+            member['last_seen'] = now
+            if cumulative is not None and cumulative >= member['cumulative']:
+                member['cumulative'] = cumulative
+                member['bitmap'] = bitmap
+            if bytes_complete is not None:
+                member['bytes_complete'] = bytes_complete
+            member['host'] = host
+            if loss is not None:
+                member['loss'] = loss
+            return previous
+
+    def sample_rtt(self, receiver_id, rtt):
+        # SRTT/RTTVAR smoothing as in RFC 6298, the RTO is clamped to [MIN_RTO, MAX_RTO]
+        with self.lock:
+            member = self.members.get(receiver_id)
+            if member is None:
+                return
+            if member['srtt'] is None:
+                member['srtt'] = rtt
+                member['rttvar'] = rtt / 2
+            else:
+                member['rttvar'] = 0.75 * member['rttvar'] + 0.25 * abs(member['srtt'] - rtt)
+                member['srtt'] = 0.875 * member['srtt'] + 0.125 * rtt
+            member['rto'] = min(self.MAX_RTO, max(self.MIN_RTO, member['srtt'] + 4 * member['rttvar']))
+
+    def rto(self, default):
+        # A multicast packet is only delivered once the slowest receiver answers
+        with self.lock:
+            timeouts = [member['rto'] for member in self.members.values() if member['rto'] is not None]
+        return max(timeouts) if timeouts else default
+
+    def feedback(self):
+        # (receiver_id, srtt, loss event rate) of every member with an RTT sample
+        with self.lock:
+            return [(receiver_id, member['srtt'], member['loss']) for receiver_id, member in self.members.items()
+                    if member['srtt'] is not None]
+
+    def all_on_host(self, host):
+        # True when there are members and every one of them shares the given host
+        with self.lock:
+            return bool(self.members) and all(member['host'] == host for member in self.members.values())
+
+    def remove(self, receiver_id):
+        with self.lock:
+            if self.members.pop(receiver_id, None) is not None:
+                print(f"Receiver {receiver_id} left")
+
+    def expire(self):
+        now = time.time()
+        with self.lock:
+            expired = [receiver_id for receiver_id, member in self.members.items() if now - member['last_seen'] > self.timeout]
+            for receiver_id in expired:
+                del self.members[receiver_id]
+                print(f"Receiver {receiver_id} timed out, removed from membership")
+        return expired
+
+    def _has_sequence(self, member, seq_num):
+        offset = seq_num - member['cumulative'] - 1
+        return offset < 0 or (offset < 64 and member['bitmap'] >> offset & 1)
+
+    def all_acked(self, seq_num, transfer=None):
+        # A packet is delivered once every live member has it; members excused from
+        # a transfer are not waited for on its chunks
+        with self.lock:
+            if not self.members:
+                return False
+            return all(self._has_sequence(member, seq_num) for member in self.members.values()
+                       if transfer is None or transfer not in member['excused'])
+
+    def excuse(self, transfer, seq_num, sequences=()):
+        # Members badly behind on seq_num stop holding back the rest of the transfer.
+        # sequences are the packets in flight every member has had time to acknowledge.
+        # At most half the members are excused: when most of them miss the packets the
+        # trouble is on the sender's side and nobody is
+        sequences = set(sequences) | {seq_num}
+        with self.lock:
+            active = {receiver_id: member for receiver_id, member in self.members.items() if transfer not in member['excused']}
+            lagging = [receiver_id for receiver_id, member in active.items()
+                       if not self._has_sequence(member, seq_num)
+                       and sum(not self._has_sequence(member, other) for other in sequences) >= self.EXCUSE_MISSING * len(sequences)]
+            if len(lagging) * 2 > len(active):
+                return []
+            for receiver_id in lagging:
+                self.members[receiver_id]['excused'].add(transfer)
+            return lagging
+
+    def excused(self, transfer):
+        with self.lock:
+            return [receiver_id for receiver_id, member in self.members.items() if transfer in member['excused']]
+
+    def clear_excused(self, transfer):
+        with self.lock:
+            for member in self.members.values():
+                member['excused'].discard(transfer)
+
+    def snapshot(self, host=None):
+        # host is the sender's host token, members reporting it are flagged local
+        now = time.time()
+        with self.lock:
+            return [{
+                'receiver_id': receiver_id,
+                'address': member['address'],
+                'highest_contiguous': member['cumulative'],
+                'bytes_complete': member['bytes_complete'],
+                'joined': member['joined'],
+                'idle': round(now - member['last_seen'], 3),
+                'local': host is not None and member['host'] == host,
+                'srtt_ms': None if member['srtt'] is None else round(member['srtt'] * 1000, 2),
+                'rto_ms': None if member['rto'] is None else round(member['rto'] * 1000, 2),
+                'loss': member['loss']
+            } for receiver_id, member in self.members.items()]
+
+class SendScheduler:
+    # Priority classes, served strictly in this order
+    CONTROL = 0
+    TEXT = 1
+    REPAIR = 2
+    BULK = 3
+
+    def __init__(self, sock, destination, rate=256 * 1024, profiler=None):
+        self.sock = sock
+        self.destination = destination
+        self.profiler = profiler or StageProfiler('scheduler')
+        # Pacing rate in bytes per second for repair and bulk traffic (0 disables pacing);
+        # control and text are never held back but still consume the budget
+        self.rate = rate
+        self.burst = 16 * 1024
+        self.tokens = self.burst
+        self.last_refill = time.time()
+        # Bulk flows share the remaining bandwidth by deficit round robin
+        self.quantum = 1500
+        self.queues = {self.CONTROL: deque(), self.TEXT: deque(), self.REPAIR: deque()}
+        self.flows = {}  # flow -> {'queue', 'weight', 'deficit'}
+        self.active_flows = deque()
+        # Counts packets encoded at send time, so their numbers follow wire order
+        # whatever order the flows are served in
+        self.lane_sequence = 0
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, packet_data, priority, flow=None, weight=1, on_sent=None, size=None):
+        # packet_data may be a function build(lane_sequence) that encodes the packet
+        # when it is sent; size is then its estimated length until it is built
+        item = (len(packet_data) if size is None else size, packet_data, on_sent)
+        with self.cond:
+            if priority == self.BULK:
+                state = self.flows.get(flow)
+                if state is None:
+                    state = {'queue': deque(), 'weight': weight, 'deficit': 0}
+                    self.flows[flow] = state
+                    self.active_flows.append(flow)
+                state['queue'].append(item)
+            else:
+                self.queues[priority].append(item)
+            self.cond.notify()
+
+    def _refill(self):
+        now = time.time()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _next_bulk(self):
+        # Deficit round robin: a flow sends while its deficit covers the head packet,
+        # otherwise it earns quantum * weight and goes to the back
+        while self.active_flows:
+            flow = self.active_flows[0]
+            state = self.flows[flow]
+            if not state['queue']:
+                self.active_flows.popleft()
+                del self.flows[flow]
+                continue
+            if state['deficit'] >= state['queue'][0][0]:
+                state['deficit'] -= state['queue'][0][0]
+                return state['queue'].popleft()
+            state['deficit'] += self.quantum * state['weight']
+            self.active_flows.rotate(-1)
+        return None
+
+    def _next_packet(self):
+        # Called with cond held, blocks until a packet may be sent
+        while self.running:
+            for priority in (self.CONTROL, self.TEXT):
+                if self.queues[priority]:
+                    return self.queues[priority].popleft()
+            
+            if self.queues[self.REPAIR] or self.active_flows:
+                self._refill()
+                if self.rate and self.tokens < 0:
+                    # Wait for budget, but wake up early for control and text
+                    started = self.profiler.start()
+                    self.cond.wait(-self.tokens / self.rate)
+                    self.profiler.stop('pacing_wait', started)
+                    continue
+                if self.queues[self.REPAIR]:
+                    return self.queues[self.REPAIR].popleft()
+                item = self._next_bulk()
+                if item is not None:
+                    return item
+                continue
+            
+            self.cond.wait()
+        return None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                item = self._next_packet()
+                if item is None:
+                    return
+                size, packet_data, on_sent = item
+                self._refill()
+                self.tokens -= size
+            if callable(packet_data):
+                packet_data = packet_data(self.lane_sequence)
+                self.lane_sequence += 1
+                with self.cond:
+                    self.tokens -= len(packet_data) - size
+            try:
+                started = self.profiler.start()
+                self.sock.sendto(packet_data, self.destination)
+                self.profiler.stop('sendto', started)
+            except Exception as e:
+                print(f"Error sending packet: {e}")
+            if on_sent:
+                on_sent()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+class CongestionController:
+    # TFMCC-style rate control (RFC 4654): each receiver's fair rate comes from the
+    # TCP throughput equation of RFC 5348, the sender paces at the lowest one. With
+    # no loss reported anywhere the rate doubles every RTT like slow start.
+    # Increases are limited to doubling per RTT and need ACKs for new data, decreases
+    # apply immediately. With nothing delivered for IDLE_RTTS round trips (at least
+    # IDLE_MIN seconds) the rate halves, down to where it started.
+    # The rate is the sender's total, striped senders split it evenly over the stripes.
+    IDLE_RTTS = 4
+    IDLE_MIN = 0.5
+
+    def __init__(self, schedulers, registry, packet_size=CC_PACKET_SIZE, min_rate=CC_MIN_RATE, max_rate=CC_MAX_RATE):
+        self.schedulers = schedulers
+        self.registry = registry
+        self.packet_size = packet_size
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = sum(scheduler.rate for scheduler in schedulers)
+        self.initial_rate = self.rate
+        self.limiting = None  # Receiver whose feedback set the current rate
+        self.last_update = 0
+        self.last_backoff = 0
+        self.last_progress = time.time()  # Last ACK for new data, or the last idle decay
+        self.lock = threading.Lock()
+
+    def tcp_rate(self, rtt, loss):
+        # Bytes per second a TCP flow would get at this RTT and loss event rate
+        rto = 4 * rtt
+        denominator = (rtt * math.sqrt(2 * loss / 3) +
+                       rto * 3 * math.sqrt(3 * loss / 8) * loss * (1 + 32 * loss ** 2))
+        return self.packet_size / denominator
+
+    def _set_rate(self, rate):
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+        for scheduler in self.schedulers:
+            scheduler.rate = self.rate / len(self.schedulers)
+
+    def update(self, progressed):
+        # Called for every ACK, acts at most once per round trip of the slowest receiver.
+        # progressed tells whether the ACK acknowledged new data; heartbeats of idle
+        # receivers do not, so they never raise the rate
+        feedback = self.registry.feedback()
+        if not feedback:
+            return
+        now = time.time()
+        rtt = max(srtt for receiver_id, srtt, loss in feedback)
+        with self.lock:
+            if progressed:
+                self.last_progress = now
+            elif now - self.last_progress >= max(self.IDLE_RTTS * rtt, self.IDLE_MIN):
+                self.last_progress = now
+                self._set_rate(min(self.rate, max(self.initial_rate, self.rate / 2)))
+            if now - self.last_update < rtt:
+                return
+            self.last_update = now
+            rate = self.rate
+            lossy = [(self.tcp_rate(max(srtt, 0.001), loss), receiver_id) for receiver_id, srtt, loss in feedback if loss > 0]
+            if lossy:
+                target, limiting = min(lossy)
+            else:
+                target, limiting = 2 * rate, None
+            if not progressed:
+                target = min(target, rate)
+            if limiting != self.limiting:
+                print(f"Rate now limited by {limiting or 'no receiver'}")
+                self.limiting = limiting
+            self._set_rate(min(target, 2 * rate))
+
+    def on_timeout(self):
+        # A retransmission timeout is a loss nobody reported yet: halve the rate,
+        # at most once per RTO so a window of timeouts counts as one event
+        now = time.time()
+        with self.lock:
+            if now - self.last_backoff < self.registry.rto(ReceiverRegistry.MAX_RTO):
+                return
+            self.last_backoff = now
+            self.last_update = now
+            self._set_rate(self.rate / 2)
+
+    def state(self):
+        return {'rate': self.rate, 'limiting': self.limiting}
+
+class RepairServer:
+    # Serves byte ranges of files being sent over TCP; the data goes from the page
+    # cache to the socket with sendfile, so repairs cost the sender no copies
+    def __init__(self, host='', port=0, linger=None):
+        self.linger = REPAIR_LINGER if linger is None else linger
+        self.files = {}  # transfer id -> file path
+        self.lock = threading.Lock()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._accept)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def register(self, transfer, file_path):
+        with self.lock:
+            self.files[transfer] = file_path
+    
+    def release(self, transfer):
+        # Receivers fetch after DONE, so the file is kept around for a while longer
+        timer = threading.Timer(self.linger, self._forget, args=(transfer,))
+        timer.daemon = True
+        timer.start()
+    
+    def _forget(self, transfer):
+        with self.lock:
+            self.files.pop(transfer, None)
+    
+    def _accept(self):
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except OSError:
+                break
+            thread = threading.Thread(target=self._serve, args=(conn, addr))
+            thread.daemon = True
+            thread.start()
+    
+    def _serve(self, conn, addr):
+        # Request: one JSON line {'transfer', 'ranges': [[offset, length], ...]}
+        try:
+            with conn, conn.makefile('rb') as reader:
+                request = json.loads(reader.readline().decode())
+                with self.lock:
+                    file_path = self.files.get(request['transfer'])
+                if file_path is None:
+                    print(f"Repair request from {addr[0]} for unknown transfer {request['transfer']}")
+                    return
+                total = 0
+                with open(file_path, 'rb') as file:
+                    size = os.fstat(file.fileno()).st_size
+                    for offset, length in request['ranges']:
+                        offset = max(0, offset)
+                        length = max(0, min(length, size - offset, REPAIR_PIECE))
+                        conn.sendall(REPAIR_HEADER.pack(offset, length))
+                        if length:
+                            conn.sendfile(file, offset, length)
+                        total += length
+                print(f"Repaired {len(request['ranges'])} range(s), {total} bytes of transfer {request['transfer']} for {addr[0]}")
+        except Exception as e:
+            print(f"Error serving repair request: {e}")
+    
+    def close(self):
+        self.sock.close()
+
 class ReliableMulticastSender:
-    def __init__(self, multicast_group, port):
+    def __init__(self, multicast_group, port, rate=256 * 1024, profiler=None, trace=None, repair=True, congestion_control=True,
+                 interfaces=None, stripes=1):
         self.multicast_group = multicast_group
         self.port = port
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack('b', 1))
+        # Per-stage timers, off unless MUCAST_PROFILE is set
+        self.profiler = profiler or StageProfiler.from_env('sender')
+        # One socket and paced, prioritized scheduler per stripe (see MulticastInterfaces);
+        # file chunks are spread over all of them, everything else uses the first.
+        # rate is the total, each stripe paces at its share
+        self.lanes = []
+        lanes = stripe_lanes(multicast_group, stripes, interfaces)
+        for group, interface in lanes:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack('b', 1))
+            set_multicast_interface(sock, interface)
+            # Optionally record every datagram sent and every ACK received to a packet trace
+            if trace:
+                sock = TracingSocket(sock, trace)
+            self.lanes.append(SendScheduler(sock, (group, port), rate / len(lanes), self.profiler))
+        self.scheduler = self.lanes[0]
+        self.sock = self.scheduler.sock
         self.sequence_number = 0
+        self.sequence_lock = threading.Lock()
         self.ack_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.ack_sock.bind(('', 0))  # Bind to any available port
         self.ack_port = self.ack_sock.getsockname()[1]
+        if trace:
+            self.ack_sock = TracingSocket(self.ack_sock, trace)
+        self.pending_acks = {}  # seq_num -> transfer id for file chunks, None otherwise
+        # Guards pending_acks and transmit_times, notified whenever an ACK
+        # arrives or a tracked packet actually leaves the scheduler
+        self.ack_ready = threading.Condition()
+        # First transmission time per sequence, the only packets RTT is sampled from (Karn's rule)
+        self.transmit_times = {}
+        # Live receivers and their delivery progress
+        self.registry = ReceiverRegistry()
+        # Adapts the scheduler's pacing rate to receiver loss and RTT, starting from rate
+        self.congestion = CongestionController(self.lanes, self.registry) if congestion_control else None
+        
+        # Message channel: single-datagram text messages with their own sequence space,
+        # optionally coalesced for coalesce_window_us microseconds before sending
+        self.message_sequence = 0
+        self.coalesce_window_us = 0
+        self.max_message_bytes = MESSAGE_DATAGRAM
+        self.message_queue = []
+        self.message_queue_bytes = 0
+        self.message_first_time = 0
+        self.message_ready = threading.Condition()
+        self.message_history = {}  # msg_sequence -> [packet_data, sent_time, repair_time], kept for repairs
+        self.message_history_size = 1024
+        self.coalesce_thread = None
+        self.max_retries = 3
+        # Retransmission timeout until the first RTT sample, afterwards the registry's RTO
+        # is used, doubled for every retry of the same packet
+        self.retry_delay = 0.1
+        # Receivers batch ACKs for up to this long (their ack_interval); only packets
+        # sent without ack_now wait for it on top of the RTO
+        self.max_ack_delay = 0.05
+        # Number of file chunks allowed in flight per transfer before waiting for ACKs
+        self.window_size = 32
+        # File blocks read ahead of the send window, see FileReadAhead
+        self.read_ahead_depth = READ_AHEAD_DEPTH
+        # Hex encoded chunks of recently sent files, reused when a file is sent again
+        self.packet_cache = PacketCache()
+        # Hand files to same-host receivers through SPOOL_DIR when all of them are local
+        self.local_spool = True
+        try:
+            self.host_token = local_host_token()
+        except OSError as e:
+            print(f"Error creating host token: {e}")
+            self.host_token = None
+        self.spooling = {}  # Spooled transfer -> receivers that could not open its spool
+        # Receivers that stall a transfer are excused and repair it over TCP instead
+        self.repair_server = RepairServer() if repair else None
+        
         self.ack_thread = threading.Thread(target=self._listen_for_acks)
         self.ack_thread.daemon = True
         self.ack_thread.start()
-        self.pending_acks = {}
-        self.max_retries = 3
-        self.retry_delay = 0.1
 
     def _listen_for_acks(self):
         while True:
@@ -49,104 +585,481 @@ class ReliableMulticastSender:
                 data, addr = self.ack_sock.recvfrom(1024)
                 ack_data = json.loads(data.decode())
                 if ack_data['type'] == 'ACK':
-                    seq_num = ack_data['sequence']
-                    if seq_num in self.pending_acks:
-                        del self.pending_acks[seq_num]
+                    if 'cumulative' in ack_data:
+                        previous = self.registry.update(ack_data['receiver_id'], addr, ack_data['cumulative'], ack_data.get('bitmap', 0), ack_data.get('bytes'), ack_data.get('host'), ack_data.get('loss'))
+                        # Recorded before the FILE_INFO this ACK may cover is released
+                        for transfer in ack_data.get('spool_failed', ()):
+                            if transfer in self.spooling:
+                                self.spooling[transfer].add(ack_data['receiver_id'])
+                        if ack_data['cumulative'] > previous:
+                            self._sample_rtt(ack_data['receiver_id'], ack_data['cumulative'])
+                        if self.congestion:
+                            self.congestion.update(ack_data['cumulative'] > previous)
+                        self._recheck_pending()
+                    else:
+                        with self.ack_ready:
+                            self.pending_acks.pop(ack_data['sequence'], None)
+                            self.transmit_times.pop(ack_data['sequence'], None)
+                            self.ack_ready.notify_all()
+                    if ack_data.get('msg_highest') is not None:
+                        self._repair_message_tail(ack_data['msg_highest'])
+                elif ack_data['type'] == 'MSG_NACK':
+                    self._resend_messages(ack_data['missing'])
+                elif ack_data['type'] == 'LEAVE':
+                    self.registry.remove(ack_data['receiver_id'])
+                    self._recheck_pending()
             except Exception as e:
                 print(f"Error receiving ACK: {e}")
 
-    def _send_with_retry(self, data, is_file=False):
-        seq_num = self.sequence_number
-        self.sequence_number += 1
-        
-        # Prepare packet
+    def _sample_rtt(self, receiver_id, seq_num):
+        # The newly acknowledged cumulative sequence gives one RTT sample, unless it was
+        # retransmitted and the ACK could belong to either copy
+        with self.ack_ready:
+            sent = self.transmit_times.get(seq_num)
+        if sent is not None:
+            self.registry.sample_rtt(receiver_id, time.time() - sent)
+
+    def _retransmit_timeout(self, entry):
+        timeout = self.registry.rto(self.retry_delay) * 2 ** entry['retries'] + entry['ack_delay']
+        return min(ReceiverRegistry.MAX_RTO, timeout)
+
+    def _recheck_pending(self):
+        # Drop every pending packet that all live members have acknowledged and wake the senders
+        with self.ack_ready:
+            for seq_num in list(self.pending_acks):
+                if self.registry.all_acked(seq_num, self.pending_acks[seq_num]):
+                    del self.pending_acks[seq_num]
+                    self.transmit_times.pop(seq_num, None)
+            self.ack_ready.notify_all()
+
+    def _wait_for_members(self, seq_num):
+        # Stop retransmitting and give lagging receivers until the membership
+        # timeout to answer; dead ones are pruned instead of retried against
+        deadline = time.time() + self.registry.timeout
+        with self.ack_ready:
+            while seq_num in self.pending_acks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.pending_acks.pop(seq_num, None)
+                    self.transmit_times.pop(seq_num, None)
+                    return False
+                # Wake up at least twice a second to expire silent members
+                self.ack_ready.wait(min(remaining, 0.5))
+                if self.registry.expire():
+                    self._recheck_pending()
+        return True
+
+    def get_members(self):
+        # Operator view of the membership table
+        self.registry.expire()
+        return self.registry.snapshot(self.host_token)
+
+    def _next_sequence(self):
+        with self.sequence_lock:
+            seq_num = self.sequence_number
+            self.sequence_number += 1
+            return seq_num
+
+    def _build_packet(self, seq_num, data, is_file=False, ack_now=False, transfer=None, fields=None):
+        # Prepare packet; header fields come before 'data' so receivers can
+        # route a packet by peeking at its first bytes
         packet = {
             'sequence': seq_num,
             'type': 'FILE' if is_file else 'TEXT',
-            'data': data,
             'ack_port': self.ack_port
         }
+        # Concurrent file transfers are told apart by their transfer id
+        if transfer is not None:
+            packet['transfer'] = transfer
+        # Ask receivers to acknowledge immediately instead of waiting for their batch
+        if ack_now:
+            packet['ack_now'] = True
+        if fields:
+            packet.update(fields)
+        packet['data'] = data
         
         # Add checksum
+        started = self.profiler.start()
         packet['checksum'] = hashlib.md5(str(packet).encode()).hexdigest()
+        self.profiler.stop('md5', started)
         
         # Convert to JSON and encode
+        started = self.profiler.start()
         packet_data = json.dumps(packet).encode()
+        self.profiler.stop('json_encode', started)
+        return packet_data
+
+    def _submit_tracked(self, seq_num, packet_data, priority, entry, flow=None, weight=1, scheduler=None, size=None):
+        # The retransmission timer starts when the scheduler actually sends the packet
+        first = entry['retries'] == 0
+        with self.ack_ready:
+            entry['sent'] = None
+            if not first:
+                # Karn's rule: an ACK for a retransmitted packet is no RTT sample
+                self.transmit_times.pop(seq_num, None)
+        def on_sent():
+            with self.ack_ready:
+                entry['sent'] = time.time()
+                if first and seq_num in self.pending_acks:
+                    self.transmit_times[seq_num] = entry['sent']
+                self.ack_ready.notify_all()
+        (scheduler or self.scheduler).submit(packet_data, priority, flow, weight, on_sent, size)
+
+    def _next_deadline(self, entries):
+        # Seconds until the earliest retransmission is due, None while nothing has been sent
+        now = time.time()
+        deadlines = [entry['sent'] + self._retransmit_timeout(entry) - now
+                     for entry in entries if entry['sent'] is not None]
+        return max(0, min(deadlines)) if deadlines else None
+
+    def _send_with_retry(self, data, is_file=False, transfer=None, priority=SendScheduler.CONTROL, fields=None):
+        seq_num = self._next_sequence()
+        
+        packet_data = self._build_packet(seq_num, data, is_file, ack_now=True, transfer=transfer, fields=fields)
         
-        # Send packet with retries
-        retries = 0
-        while retries < self.max_retries:
+        # Send packet with retries, each one waiting twice as long as the last
+        entry = {'retries': 0, 'ack_delay': 0}
+        while entry['retries'] < self.max_retries:
             try:
-                self.sock.sendto(packet_data, (self.multicast_group, self.port))
-                self.pending_acks[seq_num] = time.time()
+                with self.ack_ready:
+                    self.pending_acks[seq_num] = None
+                self._submit_tracked(seq_num, packet_data, priority, entry)
                 
-                # Wait for ACK
-                start_time = time.time()
-                while time.time() - start_time < self.retry_delay:
-                    if seq_num not in self.pending_acks:
-                        return True
-                    time.sleep(0.01)
+                # Wait for the ACK, woken by the ACK thread instead of polling
+                started = self.profiler.start()
+                with self.ack_ready:
+                    while seq_num in self.pending_acks:
+                        timeout = self._next_deadline([entry])
+                        if timeout == 0:
+                            break
+                        self.ack_ready.wait(timeout)
+                    acked = seq_num not in self.pending_acks
+                self.profiler.stop('ack_wait', started)
+                if acked:
+                    return True
                 
-                retries += 1
-                if retries < self.max_retries:
+                entry['retries'] += 1
+                if self.congestion:
+                    self.congestion.on_timeout()
+                if entry['retries'] < self.max_retries:
                     print(f"Retrying packet {seq_num}...")
-                    time.sleep(self.retry_delay)
             except Exception as e:
                 print(f"Error sending packet: {e}")
-                retries += 1
+                entry['retries'] += 1
+        
+        return self._wait_for_members(seq_num)
+
+    def _send_windowed(self, items, is_file=False, transfer=None, weight=1, sequences=None):
+        # Keep up to window_size packets per stripe in flight, the receivers acknowledge
+        # them in batches with cumulative ACKs. Pacing is left to the schedulers,
+        # packets take turns over the stripes and are retransmitted on their own.
+        # items are (offset, data) pairs; the sequence numbers used are appended
+        # to sequences as [first, last] ranges
+        in_flight = {}  # seq_num -> {'data', 'fields', 'lane', 'sent', 'retries'}
+        items = iter(items)
+        exhausted = False
+        window = self.window_size * len(self.lanes)
+        lanes = 0
+        
+        while not exhausted or in_flight:
+            # Fill the window
+            while not exhausted and len(in_flight) < window:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                offset, data = item
+                seq_num = self._next_sequence()
+                if sequences is not None:
+                    if sequences and sequences[-1][1] == seq_num - 1:
+                        sequences[-1][1] = seq_num
+                    else:
+                        sequences.append([seq_num, seq_num])
+                with self.ack_ready:
+                    self.pending_acks[seq_num] = transfer
+                lane = lanes % len(self.lanes)
+                lanes += 1
+                fields = {'offset': offset}
+                entry = {'data': data, 'fields': fields, 'lane': self.lanes[lane], 'retries': 0, 'ack_delay': self.max_ack_delay}
+                in_flight[seq_num] = entry
+                # The lane's loss counter is stamped by its scheduler as the packet goes out,
+                # retransmissions repeat it and are ignored by the receivers' loss history
+                def build(lane_seq, seq_num=seq_num, data=data, fields=fields, lane=lane):
+                    fields['lane'] = [lane, lane_seq]
+                    return self._build_packet(seq_num, data, is_file, transfer=transfer, fields=fields)
+                self._submit_tracked(seq_num, build, SendScheduler.BULK, entry, transfer, weight, entry['lane'], len(data))
+            
+            # Drop acknowledged packets and retransmit the ones that timed out
+            with self.ack_ready:
+                acked = [seq_num for seq_num in in_flight if seq_num not in self.pending_acks]
+            for seq_num in acked:
+                del in_flight[seq_num]
+            now = time.time()
+            for seq_num in list(in_flight):
+                entry = in_flight[seq_num]
+                if entry['sent'] is None or now - entry['sent'] < self._retransmit_timeout(entry):
+                    continue
+                if entry['retries'] + 1 >= self.max_retries:
+                    if self.repair_server and transfer is not None:
+                        # Do not hold everyone back for the few receivers this far behind,
+                        # they skip the rest of the transfer and fetch their gaps over TCP
+                        settled = [other for other, other_entry in in_flight.items()
+                                   if other_entry['sent'] is not None and now - other_entry['sent'] >= self._retransmit_timeout(other_entry)]
+                        lagging = self.registry.excuse(transfer, seq_num, settled)
+                        if lagging:
+                            print(f"Receiver(s) {', '.join(lagging)} lagging, transfer {transfer} will be repaired over TCP")
+                        self._recheck_pending()
+                    if not self._wait_for_members(seq_num):
+                        return False
+                    del in_flight[seq_num]
+                    continue
+                print(f"Retrying packet {seq_num}...")
+                if self.congestion:
+                    self.congestion.on_timeout()
+                entry['retries'] += 1
+                entry['ack_delay'] = 0  # Repairs are acknowledged immediately
+                packet_data = self._build_packet(seq_num, entry['data'], is_file, ack_now=True, transfer=transfer, fields=entry['fields'])
+                self._submit_tracked(seq_num, packet_data, SendScheduler.REPAIR, entry, scheduler=entry['lane'])
+            
+            if in_flight and (exhausted or len(in_flight) >= window):
+                # Sleep until an ACK arrives, a packet leaves the scheduler or the
+                # earliest retransmission is due
+                started = self.profiler.start()
+                with self.ack_ready:
+                    if all(seq_num in self.pending_acks for seq_num in in_flight):
+                        timeout = self._next_deadline(in_flight.values())
+                        if timeout != 0:
+                            self.ack_ready.wait(timeout if timeout is not None else ReceiverRegistry.MAX_RTO)
+                self.profiler.stop('window_wait', started)
         
-        return False
+        return True
+
+    def _read_chunks(self, file_path):
+        # A file sent recently comes encoded from the packet cache. Otherwise disk reads
+        # happen on the read-ahead thread, file_read only times the wait for it.
+        key = content_key([file_path], 1024, 'hex')
+        cached = self.packet_cache.get(key)
+        if cached is not None:
+            yield from cached
+            return
+        # Hex doubles the size
+        cache_size = 2 * os.path.getsize(file_path)
+        recorded = [] if self.packet_cache.fits(cache_size) else None
+        reader = FileReadAhead([file_path], self.read_ahead_depth)
+        try:
+            chunks = reader.chunks(1024)
+            offset = 0
+            while True:
+                started = self.profiler.start()
+                chunk = next(chunks, None)
+                self.profiler.stop('file_read', started)
+                if chunk is None:
+                    break
+                started = self.profiler.start()
+                size = len(chunk)
+                chunk = chunk.hex()
+                self.profiler.stop('hex_encode', started)
+                if recorded is not None:
+                    recorded.append((offset, chunk))
+                yield offset, chunk
+                offset += size
+        finally:
+            reader.close()
+        if recorded is not None:
+            self.packet_cache.put(key, recorded, cache_size)
 
-    def send_file(self, file_path):
+    def send_file(self, file_path, weight=1):
+        # Safe to call from several threads at once; weight sets this transfer's
+        # share of the bulk bandwidth against other concurrent transfers
+        transfer = os.urandom(4).hex()
         try:
             # Get file size
             file_size = os.path.getsize(file_path)
             file_name = os.path.basename(file_path)
+
+            if self.local_spool and self.host_token and self.registry.all_on_host(self.host_token):
+                if self._send_file_spooled(file_path, file_name, file_size, transfer):
+                    return
             
             # Send file info
             file_info = {
                 'name': file_name,
                 'size': file_size
             }
-            if not self._send_with_retry(file_info, True):
+            if self.repair_server:
+                self.repair_server.register(transfer, file_path)
+                file_info['repair_port'] = self.repair_server.port
+            if not self._send_with_retry(file_info, True, transfer):
                 print("Failed to send file info")
                 return
             
             # Send file content in chunks
-            with open(file_path, 'rb') as file:
-                while True:
-                    chunk = file.read(1024)
-                    if not chunk:
-                        break
-                    if not self._send_with_retry(chunk.hex(), True):
-                        print("Failed to send file chunk")
-                        return
-                    time.sleep(0.01)  # Small delay
+            sequences = []
+            if not self._send_windowed(self._read_chunks(file_path), True, transfer, weight, sequences):
+                print("Failed to send file chunk")
+                return
+            
+            # Excused receivers count the transfer's chunks as received and fetch
+            # whatever they are missing from the repair server
+            fields = None
+            lagging = self.registry.excused(transfer)
+            if lagging:
+                fields = {'repair': {'receivers': lagging, 'sequences': sequences}}
             
             # Send end marker
-            if not self._send_with_retry("DONE", True):
+            if not self._send_with_retry("DONE", True, transfer, fields=fields):
                 print("Failed to send end marker")
                 return
             
-            print(f"File {file_name} sent successfully!")
+            print(f"File {file_name} sent successfully to {len(self.registry.snapshot())} receiver(s)!")
             
         except Exception as e:
             print(f"Error sending file: {e}")
+        finally:
+            self.registry.clear_excused(transfer)
+            if self.repair_server:
+                self.repair_server.release(transfer)
+
+    def _send_file_spooled(self, file_path, file_name, file_size, transfer):
+        # Same FILE_INFO/DONE exchange as the multicast path, but the chunks are replaced
+        # by a spool path. Receivers open the spool on FILE_INFO, so it can be removed as
+        # soon as DONE has been acknowledged by everyone. Returns False when a receiver
+        # could not open the spool: the caller then multicasts the file under the same
+        # transfer id, whose FILE_INFO replaces the spooled one at every receiver
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        spool_path = os.path.join(SPOOL_DIR, f"{transfer}.spool")
+        self.spooling[transfer] = set()
+        try:
+            try:
+                os.link(file_path, spool_path)
+            except OSError:
+                shutil.copyfile(file_path, spool_path)  # Different filesystem
+
+            file_info = {
+                'name': file_name,
+                'size': file_size,
+                'spool': spool_path
+            }
+            if not self._send_with_retry(file_info, True, transfer):
+                print("Failed to send file info")
+                return True
+            if self.spooling[transfer]:
+                print(f"Receiver(s) {', '.join(sorted(self.spooling[transfer]))} could not open the spool, sending {file_name} over multicast")
+                return False
+
+            if not self._send_with_retry("DONE", True, transfer):
+                print("Failed to send end marker")
+                return True
+
+            print(f"File {file_name} handed to {len(self.registry.snapshot())} local receiver(s) via {SPOOL_DIR}")
+            return True
+        finally:
+            del self.spooling[transfer]
+            try:
+                os.remove(spool_path)
+            except OSError:
+                pass
+
+    def _pack_messages(self):
+        # Called with message_ready held: turn the queued messages into one datagram
+        msg_seq = self.message_sequence
+        self.message_sequence += 1
+        packet = {
+            'type': 'MSG',
+            'msg_sequence': msg_seq,
+            'messages': self.message_queue,
+            'ack_port': self.ack_port
+        }
+        packet['checksum'] = hashlib.md5(str(packet).encode()).hexdigest()
+        packet_data = json.dumps(packet).encode()
+        
+        self.message_queue = []
+        self.message_queue_bytes = 0
+        self.message_history[msg_seq] = [packet_data, time.time(), 0]
+        self.message_history.pop(msg_seq - self.message_history_size, None)
+        return packet_data
+
+    def _coalesce_messages(self):
+        while True:
+            with self.message_ready:
+                while not self.message_queue:
+                    self.message_ready.wait()
+                # Hold the datagram open until the window closes or it is full
+                deadline = self.message_first_time + self.coalesce_window_us / 1000000
+                while self.message_queue and time.time() < deadline:
+                    self.message_ready.wait(deadline - time.time())
+                if not self.message_queue:
+                    continue
+                packet_data = self._pack_messages()
+            self.scheduler.submit(packet_data, SendScheduler.TEXT)
+
+    def send_message(self, text):
+        # Measured as encoded: JSON escapes non-ASCII text to \uXXXX, six to twelve
+        # bytes per character, plus the separator in the message list
+        size = len(json.dumps(text)) + 2
+        budget = self.max_message_bytes - MESSAGE_HEADER
+        if size > budget:
+            return False
+        
+        ready = []
+        with self.message_ready:
+            # Flush first if this message would not fit in the pending datagram
+            if self.message_queue and self.message_queue_bytes + size > budget:
+                ready.append(self._pack_messages())
+            if not self.message_queue:
+                self.message_first_time = time.time()
+            self.message_queue.append(text)
+            self.message_queue_bytes += size
+            
+            if self.coalesce_window_us <= 0:
+                ready.append(self._pack_messages())
+            else:
+                if self.coalesce_thread is None:
+                    self.coalesce_thread = threading.Thread(target=self._coalesce_messages)
+                    self.coalesce_thread.daemon = True
+                    self.coalesce_thread.start()
+                self.message_ready.notify()
+        
+        for packet_data in ready:
+            self.scheduler.submit(packet_data, SendScheduler.TEXT)
+        return True
+
+    def _resend_messages(self, msg_sequences, min_age=0):
+        # One repair per RTO, however many receivers NACK the same datagram
+        now = time.time()
+        rto = self.registry.rto(self.retry_delay)
+        for msg_seq in msg_sequences:
+            with self.message_ready:
+                entry = self.message_history.get(msg_seq)
+                if entry is None or now - entry[1] < min_age or now - entry[2] < rto:
+                    continue
+                entry[2] = now
+            self.scheduler.submit(entry[0], SendScheduler.REPAIR)
+
+    def _repair_message_tail(self, msg_highest):
+        # A receiver behind the last message datagram lost the tail, which no NACK can reveal
+        if msg_highest < self.message_sequence - 1:
+            self._resend_messages(range(msg_highest + 1, self.message_sequence), self.registry.rto(self.retry_delay))
 
     def send_text(self, text):
+        # Anything that fits in one datagram goes through the message channel
+        if self.send_message(text):
+            print("Text message sent successfully!")
+            return
+        
         try:
             # Split text into chunks if it's too large
             chunk_size = 1024
             chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
             
             # Send number of chunks first
-            if not self._send_with_retry(str(len(chunks))):
+            if not self._send_with_retry(str(len(chunks)), priority=SendScheduler.TEXT):
                 print("Failed to send chunk count")
                 return
             
             # Send each chunk
             for i, chunk in enumerate(chunks):
-                if not self._send_with_retry(chunk):
+                if not self._send_with_retry(chunk, priority=SendScheduler.TEXT):
                     print(f"Failed to send chunk {i+1}/{len(chunks)}")
                     return
                 time.sleep(0.01)  # Small delay
@@ -157,23 +1070,50 @@ class ReliableMulticastSender:
             print(f"Error sending text message: {e}")
 
     def close(self):
-        self.sock.close()
+        if self.repair_server:
+            self.repair_server.close()
+        for lane in self.lanes:
+            lane.stop()
+            lane.sock.close()
         self.ack_sock.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reliable Multicast Sender")
+    parser.add_argument('--profile', action='store_true', help="record per-stage timings (same as MUCAST_PROFILE=stages)")
+    parser.add_argument('--record', metavar='TRACE', help="record every datagram to a packet trace file")
+    parser.add_argument('--no-spool', action='store_true', help="always send file data over multicast, even to receivers on this host")
+    parser.add_argument('--no-repair', action='store_true', help="do not run the TCP repair server for lagging receivers")
+    parser.add_argument('--cache-mb', type=int, default=CACHE_BYTES // (1024 * 1024), help="MiB of encoded chunks kept for repeated sends (0 disables)")
+    parser.add_argument('--no-congestion-control', action='store_true', help="pace at a fixed rate instead of adapting it to receiver loss and RTT")
+    parser.add_argument('--rate', type=int, default=256, help="total pacing rate in KiB/s, the starting rate under congestion control")
+    parser.add_argument('--max-rate', type=int, default=CC_MAX_RATE // 1024, help="highest rate congestion control may reach, in KiB/s")
+    parser.add_argument('--interface', action='append', metavar='ADDRESS', help="local IPv4 address of the interface to send from, repeat to stripe over several")
+    parser.add_argument('--stripes', type=int, default=1, help="spread file chunks over this many groups, one per --interface in turn")
+    parser.add_argument('--read-ahead', type=int, default=READ_AHEAD_DEPTH, help="file blocks (1 MiB each) kept read ahead of the send window")
+    args = parser.parse_args()
+    
     # Multicast configuration
     MULTICAST_GROUP = '224.3.29.71'
     MULTICAST_PORT = 10000
     
-    sender = ReliableMulticastSender(MULTICAST_GROUP, MULTICAST_PORT)
+    trace = TraceWriter(args.record, ROLE_SENDER) if args.record else None
+    sender = ReliableMulticastSender(MULTICAST_GROUP, MULTICAST_PORT, profiler=StageProfiler.from_env('sender', args.profile), trace=trace, repair=not args.no_repair,
+                                     rate=args.rate * 1024, congestion_control=not args.no_congestion_control,
+                                     interfaces=args.interface, stripes=args.stripes)
+    if sender.congestion:
+        sender.congestion.max_rate = max(CC_MIN_RATE, args.max_rate * 1024)
+    sender.read_ahead_depth = max(1, args.read_ahead)
+    sender.packet_cache = PacketCache(max(0, args.cache_mb) * 1024 * 1024)
+    sender.local_spool = not args.no_spool
     
     try:
         while True:
             print("\nReliable Multicast Sender")
             print("1. Send a file")
             print("2. Send a text message")
-            print("3. Exit")
-            choice = input("Enter your choice (1-3): ")
+            print("3. Show receivers")
+            print("4. Exit")
+            choice = input("Enter your choice (1-4): ")
             
             if choice == '1':
                 file_path = input("Enter the path of the file to send: ")
@@ -187,6 +1127,16 @@ if __name__ == "__main__":
                 print(f"Sending text message...")
                 sender.send_text(text_message)
             elif choice == '3':
+                members = sender.get_members()
+                if sender.congestion:
+                    state = sender.congestion.state()
+                    print(f"Send rate {state['rate'] / 1024:.0f} KiB/s, limited by {state['limiting'] or 'no receiver'}")
+                if not members:
+                    print("No live receivers")
+                for member in members:
+                    print(f"- {member['receiver_id']} {member['address']}: seq {member['highest_contiguous']}, "
+                          f"{member['bytes_complete']} bytes, idle {member['idle']}s, rtt {member['srtt_ms']}ms, rto {member['rto_ms']}ms, loss {member['loss']}")
+            elif choice == '4':
                 print("Exiting...")
                 break
             else:
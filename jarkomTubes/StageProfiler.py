@@ -0,0 +1,117 @@
+import os
+import time
+import json
+import atexit
+import threading
+import cProfile
+
+# MUCAST_PROFILE=stages turns on the per-stage timers, MUCAST_PROFILE=cprofile adds
+# a cProfile run on top. MUCAST_PROFILE_OUT sets the dump path (.json or .folded).
+PROFILE_ENV = 'MUCAST_PROFILE'
+PROFILE_OUT_ENV = 'MUCAST_PROFILE_OUT'
+
+class StageProfiler:
+    def __init__(self, name, enabled=False, use_cprofile=False, output=None):
+        self.name = name
+        self.enabled = enabled
+        self.output = output or f"profile_{name}.json"
+        self.counts = {}
+        self.totals = {}
+        self.histograms = {}  # stage -> counts per power-of-two nanosecond bucket
+        self.lock = threading.Lock()
+        self.closed = False
+
+        # cProfile only sees the thread that enabled it, which is enough for the main loops
+        self.cprofile = None
+        if enabled and use_cprofile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+        if not enabled:
+            # Disabled profilers cost one no-op call per stage
+            self.start = self._start_disabled
+            self.stop = self._stop_disabled
+
+    @classmethod
+    def from_env(cls, name, force=False):
+        mode = os.environ.get(PROFILE_ENV, '').lower()
+        if force and not mode:
+            mode = 'stages'
+        enabled = mode not in ('', '0', 'off')
+        output = os.environ.get(PROFILE_OUT_ENV)
+        if output:
+            root, ext = os.path.splitext(output)
+            output = f"{root}_{name}{ext}"
+        profiler = cls(name, enabled, mode == 'cprofile', output)
+        if enabled:
+            atexit.register(profiler.close)
+        return profiler
+
+    def _start_disabled(self):
+        return 0
+
+    def _stop_disabled(self, stage, started):
+        pass
+
+    def start(self):
+        return time.perf_counter_ns()
+
+    def stop(self, stage, started):
+        elapsed = time.perf_counter_ns() - started
+        bucket = elapsed.bit_length()
+        with self.lock:
+            if stage not in self.counts:
+                self.counts[stage] = 0
+                self.totals[stage] = 0
+                self.histograms[stage] = [0] * 65
+            self.counts[stage] += 1
+            self.totals[stage] += elapsed
+            self.histograms[stage][bucket] += 1
+
+    def _percentile(self, histogram, count, fraction):
+        # Upper bound of the bucket holding the percentile, in nanoseconds
+        target = count * fraction
+        seen = 0
+        for bucket, bucket_count in enumerate(histogram):
+            seen += bucket_count
+            if seen >= target:
+                return (1 << bucket) - 1 if bucket else 0
+        return 0
+
+    def report(self):
+        with self.lock:
+            stages = {}
+            for stage, count in self.counts.items():
+                histogram = self.histograms[stage]
+                stages[stage] = {
+                    'count': count,
+                    'total_ns': self.totals[stage],
+                    'mean_ns': self.totals[stage] // count,
+                    'p50_ns': self._percentile(histogram, count, 0.5),
+                    'p99_ns': self._percentile(histogram, count, 0.99),
+                    # Bucket b counts samples in [2**(b-1), 2**b) nanoseconds
+                    'histogram': {str(bucket): n for bucket, n in enumerate(histogram) if n}
+                }
+            return {'name': self.name, 'stages': stages}
+
+    def dump(self, path=None):
+        path = path or self.output
+        if path.endswith(('.folded', '.collapsed')):
+            # Collapsed stacks weighted by microseconds, ready for flamegraph.pl
+            with self.lock:
+                lines = [f"{self.name};{stage} {self.totals[stage] // 1000}" for stage in sorted(self.totals)]
+            with open(path, 'w') as file:
+                file.write('\n'.join(lines) + '\n')
+        else:
+            with open(path, 'w') as file:
+                json.dump(self.report(), file, indent=2)
+
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(os.path.splitext(path)[0] + '.pstats')
+        print(f"Profile for {self.name} written to {path}")
+
+    def close(self):
+        if self.enabled and not self.closed:
+            self.closed = True
+            self.dump()
@@ -0,0 +1,19 @@
+import os
+import sys
+import importlib.util
+
+# The two trees keep their modules next to their scripts, make all of them importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'Reciever'), os.path.join(ROOT, 'jarkomTubes'), os.path.join(ROOT, 'jarkomTubes', 'Reciever')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+def load_module(name, relative_path):
+    # Both trees have a SenderA.py, load one of them under its own name
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,26 @@
+from SenderA import collect_batch_files
+
+def test_directory_is_walked_recursively(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'a.txt').write_bytes(b'a')
+    (tmp_path / 'sub' / 'b.txt').write_bytes(b'b')
+    root, files = collect_batch_files(str(tmp_path))
+    assert root == str(tmp_path)
+    assert [relative_path for path, relative_path in files] == ['a.txt', 'sub/b.txt']
+
+def test_glob_pattern(tmp_path):
+    (tmp_path / 'a.png').write_bytes(b'a')
+    (tmp_path / 'b.png').write_bytes(b'b')
+    (tmp_path / 'c.txt').write_bytes(b'c')
+    root, files = collect_batch_files(str(tmp_path / '*.png'))
+    assert [relative_path for path, relative_path in files] == ['a.png', 'b.png']
+
+def test_file_with_glob_characters_is_taken_literally(tmp_path):
+    (tmp_path / 'shot[1].png').write_bytes(b'shot')
+    (tmp_path / 'shot1.png').write_bytes(b'other')
+    root, files = collect_batch_files(str(tmp_path / 'shot[1].png'))
+    assert root == str(tmp_path)
+    assert files == [(str(tmp_path / 'shot[1].png'), 'shot[1].png')]
+
+def test_nothing_matches(tmp_path):
+    assert collect_batch_files(str(tmp_path / '*.png')) == (None, [])
@@ -0,0 +1,55 @@
+import pytest
+from conftest import load_module
+
+sender = load_module('jarkom_sender', 'jarkomTubes/SenderA.py')
+
+class Lane:
+    def __init__(self, rate):
+        self.rate = rate
+
+def make_controller(stripes, rate=64 * 1024):
+    lanes = [Lane(rate / stripes) for _ in range(stripes)]
+    registry = sender.ReceiverRegistry()
+    registry.update('B', ('10.0.0.2', 1), cumulative=0)
+    registry.sample_rtt('B', 0.01)
+    return sender.CongestionController(lanes, registry), lanes, registry
+
+def test_rate_is_split_over_the_stripes():
+    controller, lanes, registry = make_controller(4)
+    controller._set_rate(400 * 1024)
+    assert [lane.rate for lane in lanes] == [100 * 1024] * 4
+    assert controller.state()['rate'] == 400 * 1024
+
+def test_slow_start_doubles_the_total():
+    controller, lanes, registry = make_controller(2)
+    controller.update(True)
+    assert controller.rate == 128 * 1024
+    assert sum(lane.rate for lane in lanes) == 128 * 1024
+
+def test_loss_limits_the_total_to_the_tcp_rate():
+    controller, lanes, registry = make_controller(2, 64 * 1024 * 1024 // 2)
+    registry.update('B', ('10.0.0.2', 1), loss=0.01)
+    controller.update(True)
+    assert controller.limiting == 'B'
+    assert sum(lane.rate for lane in lanes) == pytest.approx(controller.tcp_rate(0.01, 0.01))
+
+def test_heartbeats_do_not_raise_the_rate():
+    controller, lanes, registry = make_controller(2)
+    controller.update(False)
+    assert controller.rate == 64 * 1024
+
+def test_idle_rate_decays_to_the_start():
+    controller, lanes, registry = make_controller(2)
+    controller._set_rate(1024 * 1024)
+    for _ in range(8):
+        controller.last_progress -= 10
+        controller.last_update -= 10
+        controller.update(False)
+    assert controller.rate == 64 * 1024
+    assert sum(lane.rate for lane in lanes) == 64 * 1024
+
+def test_timeout_halves_the_total():
+    controller, lanes, registry = make_controller(2)
+    controller.on_timeout()
+    assert controller.rate == 32 * 1024
+    assert [lane.rate for lane in lanes] == [16 * 1024] * 2
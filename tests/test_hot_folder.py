@@ -0,0 +1,23 @@
+import os
+import SenderA
+from SenderA import SenderDaemon, VALID_CHANNELS
+
+class VanishedEntry:
+    name = 'gone.bin'
+    path = '/nonexistent/gone.bin'
+
+    def is_file(self):
+        return True
+
+    def stat(self):
+        raise FileNotFoundError(self.path)
+
+def test_vanished_file_is_skipped(tmp_path, monkeypatch):
+    token = next(iter(VALID_CHANNELS))
+    (tmp_path / token).mkdir()
+    (tmp_path / token / 'a.bin').write_bytes(b'a')
+    real_scandir = os.scandir
+    monkeypatch.setattr(SenderA.os, 'scandir', lambda path: [VanishedEntry()] + list(real_scandir(path)))
+    daemon = SenderDaemon('224.1.1.1', 5007, hot_folder=str(tmp_path))
+    current = daemon._scan_hot_folder()
+    assert list(current) == [str(tmp_path / token / 'a.bin')]
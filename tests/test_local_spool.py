@@ -0,0 +1,48 @@
+import hashlib
+import json
+import pytest
+import ReliableReciever
+from ReliableReciever import ReliableMulticastReceiver, read_host_token
+from conftest import load_module
+
+sender = load_module('jarkom_sender', 'jarkomTubes/SenderA.py')
+
+class AckSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append(json.loads(data.decode()))
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    spool_dir = tmp_path / 'spool'
+    monkeypatch.setattr(ReliableReciever, 'SPOOL_DIR', str(spool_dir))
+    monkeypatch.setattr(sender, 'SPOOL_DIR', str(spool_dir))
+    return spool_dir
+
+def test_receivers_read_the_senders_token(spool_dir):
+    assert read_host_token() is None
+    assert not spool_dir.exists()
+    token = sender.local_host_token()
+    assert len(token) == 32
+    assert sender.local_host_token() == token
+    assert read_host_token() == token
+    assert sorted(path.name for path in spool_dir.iterdir()) == ['host_token']
+
+def test_spool_that_fails_to_open_is_reported_in_the_ack(spool_dir, tmp_path):
+    token = sender.local_host_token()
+    receiver = ReliableMulticastReceiver('224.3.29.71', 10000, 'B', str(tmp_path / 'save'), open_socket=False, on_event=lambda event, info: None)
+    receiver.ack_sock = AckSocket()
+    packet = {'sequence': 0, 'type': 'FILE', 'ack_port': 9, 'transfer': 'a1b2c3d4', 'ack_now': True,
+              'data': {'name': 'file.bin', 'size': 4, 'spool': str(spool_dir / 'a1b2c3d4.spool')}}
+    packet['checksum'] = hashlib.md5(str(packet).encode()).hexdigest()
+    receiver._handle_packet(json.dumps(packet).encode(), ('127.0.0.1', 9))
+    receiver._shutdown()
+    ack = receiver.ack_sock.sent[0]
+    assert ack['cumulative'] == 0
+    assert ack['host'] == token
+    assert ack['spool_failed'] == ['a1b2c3d4']
@@ -0,0 +1,39 @@
+import pytest
+from ReliableReciever import LossHistory
+
+def test_no_loss():
+    history = LossHistory()
+    for seq_num in range(1000):
+        history.observe(seq_num)
+    assert history.loss_rate() == 0.0
+
+def test_periodic_loss():
+    # One packet in ten lost: every interval between losses is nine packets long
+    history = LossHistory()
+    for seq_num in range(1000):
+        if seq_num % 10 != 5:
+            history.observe(seq_num)
+    assert history.loss_rate() == pytest.approx(1 / 9, rel=0.05)
+
+def test_burst_is_one_loss_event():
+    history = LossHistory()
+    for seq_num in list(range(100)) + list(range(110, 200)):
+        history.observe(seq_num)
+    assert list(history.intervals) == [100]
+
+def test_late_and_repaired_packets_do_not_count():
+    history = LossHistory()
+    for seq_num in [0, 1, 3, 2, 4, 1, 5]:
+        history.observe(seq_num)
+    assert list(history.intervals) == [2]
+    assert history.current == 3
+
+def test_long_clean_run_lowers_the_rate():
+    history = LossHistory()
+    for seq_num in range(100):
+        if seq_num % 10 != 5:
+            history.observe(seq_num)
+    lossy = history.loss_rate()
+    for seq_num in range(100, 1000):
+        history.observe(seq_num)
+    assert history.loss_rate() < lossy
@@ -0,0 +1,39 @@
+import os
+import pytest
+import ReliableReciever
+from ReliableReciever import open_spool
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    spool_dir = tmp_path / 'spool'
+    spool_dir.mkdir()
+    monkeypatch.setattr(ReliableReciever, 'SPOOL_DIR', str(spool_dir))
+    return spool_dir
+
+def test_spool_in_the_spool_dir_is_opened(spool_dir):
+    (spool_dir / 't1.spool').write_bytes(b'data')
+    with open_spool(str(spool_dir / 't1.spool'), 't1') as spool:
+        assert spool.read() == b'data'
+
+def test_path_outside_the_spool_dir_is_rejected(spool_dir, tmp_path):
+    (tmp_path / 't1.spool').write_bytes(b'secret')
+    with pytest.raises(ValueError):
+        open_spool(str(tmp_path / 't1.spool'), 't1')
+    with pytest.raises(ValueError):
+        open_spool(str(spool_dir / '..' / 't1.spool'), 't1')
+
+def test_spool_of_another_transfer_is_rejected(spool_dir):
+    (spool_dir / 't2.spool').write_bytes(b'data')
+    with pytest.raises(ValueError):
+        open_spool(str(spool_dir / 't2.spool'), 't1')
+
+def test_symlink_out_of_the_spool_dir_is_rejected(spool_dir, tmp_path):
+    (tmp_path / 'secret').write_bytes(b'secret')
+    os.symlink(tmp_path / 'secret', spool_dir / 't1.spool')
+    with pytest.raises(ValueError):
+        open_spool(str(spool_dir / 't1.spool'), 't1')
+
+def test_directory_is_rejected(spool_dir):
+    (spool_dir / 't1.spool').mkdir()
+    with pytest.raises((ValueError, OSError)):
+        open_spool(str(spool_dir / 't1.spool'), 't1')
@@ -0,0 +1,53 @@
+import os
+from PacketCache import PacketCache, content_key
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PacketCache(100)
+    cache.put('a', 'A', 40)
+    cache.put('b', 'B', 40)
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 40)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+    assert cache.size == 80
+
+def test_oversized_entry_is_not_stored():
+    cache = PacketCache(100)
+    assert not cache.put('a', 'A', 101)
+    assert cache.get('a') is None
+    assert not PacketCache(0).put('a', 'A', 1)
+
+def test_replacing_an_entry_keeps_the_size_right():
+    cache = PacketCache(100)
+    cache.put('a', 'A', 60)
+    cache.put('a', 'A2', 30)
+    assert cache.size == 30
+    assert cache.get('a') == 'A2'
+
+def test_stats_count_hits_and_misses():
+    cache = PacketCache(100)
+    cache.put('a', 'A', 10)
+    cache.get('a')
+    cache.get('b')
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses']) == (1, 1, 1)
+
+def test_content_key_changes_with_the_file(tmp_path):
+    path = tmp_path / 'f.bin'
+    path.write_bytes(b'one')
+    key = content_key([str(path)], 1024)
+    assert content_key([str(path)], 1024) == key
+    assert content_key([str(path)], 512) != key
+    path.write_bytes(b'longer')
+    assert content_key([str(path)], 1024) != key
+    os.utime(path, ns=(1, 1))
+    assert content_key([str(path)], 1024, 'batch') != key
+
+def test_content_key_includes_the_names(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    path = tmp_path / 'sub' / 'f.bin'
+    path.write_bytes(b'one')
+    # The same file batched from two roots ends up under different manifest paths
+    assert content_key([str(path)], 1024, 'batch', ['sub/f.bin']) != content_key([str(path)], 1024, 'batch', ['f.bin'])
+    assert content_key([str(path)], 1024, 'batch', ['f.bin']) == content_key([str(path)], 1024, 'batch', ['f.bin'])
@@ -0,0 +1,76 @@
+from conftest import load_module
+
+sender = load_module('jarkom_sender', 'jarkomTubes/SenderA.py')
+ReceiverRegistry = sender.ReceiverRegistry
+
+def test_cumulative_ack_covers_everything_below():
+    registry = ReceiverRegistry()
+    registry.update('B', ('10.0.0.2', 1), cumulative=9)
+    assert registry.all_acked(0)
+    assert registry.all_acked(9)
+    assert not registry.all_acked(10)
+
+def test_bitmap_acks_sequences_above_the_cumulative():
+    registry = ReceiverRegistry()
+    # Bit n stands for cumulative + 1 + n: 11 and 13 received, 10 and 12 missing
+    registry.update('B', ('10.0.0.2', 1), cumulative=9, bitmap=0b1010)
+    assert not registry.all_acked(10)
+    assert registry.all_acked(11)
+    assert not registry.all_acked(12)
+    assert registry.all_acked(13)
+    assert not registry.all_acked(9 + 1 + 64)
+
+def test_every_member_must_ack():
+    registry = ReceiverRegistry()
+    registry.update('B', ('10.0.0.2', 1), cumulative=20)
+    registry.update('C', ('10.0.0.3', 1), cumulative=5)
+    assert registry.all_acked(5)
+    assert not registry.all_acked(6)
+    assert not ReceiverRegistry().all_acked(0)
+
+def test_stale_ack_does_not_move_backwards():
+    registry = ReceiverRegistry()
+    registry.update('B', ('10.0.0.2', 1), cumulative=20)
+    assert registry.update('B', ('10.0.0.2', 1), cumulative=10, bitmap=1) == 20
+    assert registry.all_acked(20)
+
+def test_excused_members_are_not_waited_for_on_their_transfer():
+    registry = ReceiverRegistry()
+    registry.update('B', ('10.0.0.2', 1), cumulative=20)
+    registry.update('C', ('10.0.0.3', 1), cumulative=5)
+    registry.update('D', ('10.0.0.4', 1), cumulative=20)
+    assert registry.excuse('t1', 10, range(6, 15)) == ['C']
+    assert registry.all_acked(10, 't1')
+    assert not registry.all_acked(10, 't2')
+    registry.clear_excused('t1')
+    assert not registry.all_acked(10, 't1')
+
+def test_receiver_missing_a_few_packets_is_not_excused():
+    registry = ReceiverRegistry()
+    registry.update('B', ('10.0.0.2', 1), cumulative=20)
+    registry.update('D', ('10.0.0.4', 1), cumulative=20)
+    # C lost only packet 10 of the ten in flight
+    registry.update('C', ('10.0.0.3', 1), cumulative=9, bitmap=0b111111111 << 1)
+    assert registry.excuse('t1', 10, range(10, 20)) == []
+    assert not registry.all_acked(10, 't1')
+
+def test_majority_is_never_excused():
+    registry = ReceiverRegistry()
+    registry.update('C', ('10.0.0.3', 1), cumulative=5)
+    assert registry.excuse('t1', 10, range(6, 15)) == []
+    registry.update('B', ('10.0.0.2', 1), cumulative=20)
+    registry.update('D', ('10.0.0.4', 1), cumulative=5)
+    assert registry.excuse('t1', 10, range(6, 15)) == []
+
+def test_one_of_two_is_excused():
+    registry = ReceiverRegistry()
+    registry.update('B', ('10.0.0.2', 1), cumulative=20)
+    registry.update('C', ('10.0.0.3', 1), cumulative=5)
+    assert registry.excuse('t1', 10, range(6, 15)) == ['C']
+
+def test_silent_members_expire():
+    registry = ReceiverRegistry(timeout=0)
+    registry.update('B', ('10.0.0.2', 1), cumulative=1)
+    registry.members['B']['last_seen'] -= 1
+    assert registry.expire() == ['B']
+    assert registry.members == {}
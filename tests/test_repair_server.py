@@ -0,0 +1,36 @@
+import socket
+import json
+from conftest import load_module
+
+sender = load_module('jarkom_sender', 'jarkomTubes/SenderA.py')
+
+def fetch(port, transfer, ranges):
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as conn:
+        conn.sendall(json.dumps({'transfer': transfer, 'ranges': ranges}).encode() + b'\n')
+        with conn.makefile('rb') as reader:
+            replies = []
+            for _ in ranges:
+                offset, length = sender.REPAIR_HEADER.unpack(reader.read(sender.REPAIR_HEADER.size))
+                replies.append((offset, reader.read(length)))
+            return replies
+
+def test_ranges_are_served_from_the_file(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(bytes(range(256)) * 4)
+    server = sender.RepairServer('127.0.0.1', linger=0)
+    try:
+        server.register('t1', str(path))
+        assert fetch(server.port, 't1', [[0, 4], [1020, 100]]) == [(0, bytes(range(4))), (1020, bytes(range(252, 256)))]
+    finally:
+        server.close()
+
+def test_long_range_is_cut_to_one_piece(tmp_path, monkeypatch):
+    monkeypatch.setattr(sender, 'REPAIR_PIECE', 16)
+    path = tmp_path / 'file.bin'
+    path.write_bytes(bytes(range(64)))
+    server = sender.RepairServer('127.0.0.1', linger=0)
+    try:
+        server.register('t1', str(path))
+        assert fetch(server.port, 't1', [[8, 64]]) == [(8, bytes(range(8, 24)))]
+    finally:
+        server.close()
@@ -0,0 +1,32 @@
+import hashlib
+import json
+from MultiChannelReciever import SpillBuffer, MemoryBudget, save_batch
+
+def build_batch(files, drop=()):
+    # Lays the batch out the way the sender does: manifest, then every file back to back,
+    # the files sent in 4-byte chunks; chunks whose offset is in drop are lost
+    manifest, offset = [], 0
+    for path, content in files:
+        manifest.append({'path': path, 'offset': offset, 'size': len(content), 'md5': hashlib.md5(content).hexdigest()})
+        offset += len(content)
+    manifest_data = json.dumps(manifest).encode()
+    data = b''.join(content for path, content in files)
+    buffer = SpillBuffer(1 << 20, MemoryBudget(1 << 20))
+    buffer.write(0, manifest_data)
+    for position in range(0, len(data), 4):
+        if position not in drop:
+            buffer.write(len(manifest_data) + position, data[position:position + 4])
+    return {'buffer': buffer, 'total_size': len(manifest_data) + len(data), 'manifest_size': len(manifest_data), 'name': 'shots'}
+
+def test_complete_batch_is_saved(tmp_path):
+    files = [('a.txt', b'aaaaaaaa'), ('b.txt', b'bbbbbbbb'), ('c.txt', b'cccccccc')]
+    assert save_batch(str(tmp_path), build_batch(files), 'ch') == (3, 3)
+    assert (tmp_path / 'shots' / 'c.txt').read_bytes() == b'cccccccc'
+
+def test_lost_chunk_only_fails_its_own_file(tmp_path):
+    files = [('a.txt', b'aaaaaaaa'), ('b.txt', b'bbbbbbbb'), ('c.txt', b'cccccccc')]
+    # Offset 8 is the start of b.txt, a.txt and c.txt must survive
+    assert save_batch(str(tmp_path), build_batch(files, drop={8}), 'ch') == (2, 3)
+    assert (tmp_path / 'shots' / 'a.txt').read_bytes() == b'aaaaaaaa'
+    assert (tmp_path / 'shots' / 'c.txt').read_bytes() == b'cccccccc'
+    assert not (tmp_path / 'shots' / 'b.txt').exists()
@@ -0,0 +1,39 @@
+import threading
+from conftest import load_module
+
+sender = load_module('jarkom_sender', 'jarkomTubes/SenderA.py')
+SendScheduler = sender.SendScheduler
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, destination):
+        self.sent.append(data)
+
+def test_lane_sequence_follows_wire_order():
+    sock = RecordingSocket()
+    scheduler = SendScheduler(sock, ('224.3.29.71', 10000), rate=0)
+    done = threading.Semaphore(0)
+    with scheduler.cond:
+        # Two flows queued before anything is sent, so deficit round robin interleaves them
+        for flow in ('a', 'b'):
+            for index in range(20):
+                build = lambda lane_seq, flow=flow, index=index: f"{flow}{index}:{lane_seq}".encode().ljust(700)
+                scheduler.submit(build, SendScheduler.BULK, flow, on_sent=done.release, size=700)
+    for _ in range(40):
+        assert done.acquire(timeout=5)
+    scheduler.stop()
+    flows = [packet.split(b':')[0][:1] for packet in sock.sent]
+    assert flows != sorted(flows)  # The flows really were reordered
+    assert [int(packet.split(b':')[1]) for packet in sock.sent] == list(range(40))
+
+def test_prebuilt_packets_take_no_lane_sequence():
+    sock = RecordingSocket()
+    scheduler = SendScheduler(sock, ('224.3.29.71', 10000), rate=0)
+    done = threading.Semaphore(0)
+    scheduler.submit(b'text', SendScheduler.TEXT, on_sent=done.release)
+    scheduler.submit(lambda lane_seq: str(lane_seq).encode(), SendScheduler.BULK, 'a', on_sent=done.release, size=1)
+    assert done.acquire(timeout=5) and done.acquire(timeout=5)
+    scheduler.stop()
+    assert sock.sent == [b'text', b'0']
@@ -0,0 +1,97 @@
+import tracemalloc
+from MultiChannelReciever import SpillBuffer, MemoryBudget
+
+def read_all(buffer):
+    return buffer.reader().read()
+
+def test_chunks_are_read_in_offset_order():
+    buffer = SpillBuffer(1024, MemoryBudget(1024))
+    buffer.write(4, b'efgh')
+    buffer.write(0, b'abcd')
+    assert read_all(buffer) == b'abcdefgh'
+    assert b''.join(buffer.blocks()) == b'abcdefgh'
+
+def test_duplicates_are_rejected():
+    buffer = SpillBuffer(1024, MemoryBudget(1024))
+    assert buffer.write(0, b'abcd')
+    assert not buffer.write(0, b'zzzz')
+    assert buffer.received == 4
+    assert read_all(buffer) == b'abcd'
+
+def test_spills_past_the_transfer_limit():
+    budget = MemoryBudget(1024)
+    buffer = SpillBuffer(6, budget)
+    buffer.write(0, b'abcd')
+    buffer.write(4, b'efgh')
+    assert buffer.file is not None
+    assert budget.in_use == 0
+    assert budget.stats()['spilled_buffers'] == 1
+    assert read_all(buffer) == b'abcdefgh'
+    buffer.close()
+
+def test_spills_when_the_global_budget_is_used_up():
+    budget = MemoryBudget(4)
+    buffer = SpillBuffer(1024, budget)
+    buffer.write(0, b'abcd')
+    buffer.write(4, b'efgh')
+    assert buffer.file is not None
+    assert read_all(buffer) == b'abcdefgh'
+
+def test_close_releases_the_budget():
+    budget = MemoryBudget(1024)
+    buffer = SpillBuffer(1024, budget)
+    buffer.write(0, b'abcd')
+    assert budget.in_use == 4
+    buffer.close()
+    assert budget.in_use == 0
+
+def test_lost_chunk_keeps_later_offsets_in_memory():
+    buffer = SpillBuffer(1024, MemoryBudget(1024))
+    buffer.write(0, b'abcd')
+    buffer.write(8, b'ijkl')
+    assert read_all(buffer) == b'abcd' + bytes(4) + b'ijkl'
+    assert b''.join(buffer.blocks()) == b'abcd' + bytes(4) + b'ijkl'
+
+def test_lost_chunk_keeps_later_offsets_when_spilled():
+    buffer = SpillBuffer(6, MemoryBudget(1024))
+    buffer.write(0, b'abcd')
+    buffer.write(8, b'ijkl')
+    assert buffer.file is not None
+    assert read_all(buffer) == b'abcd' + bytes(4) + b'ijkl'
+    buffer.close()
+
+def test_missing_reports_only_the_holes():
+    buffer = SpillBuffer(1024, MemoryBudget(1024))
+    buffer.write(0, b'abcd')
+    buffer.write(8, b'ijkl')
+    assert buffer.missing(0, 12) == [[4, 4]]
+    assert buffer.missing(0, 4) == []
+    assert buffer.missing(8, 4) == []
+    assert buffer.missing(2, 8) == [[4, 4]]
+    assert buffer.missing(8, 8) == [[12, 4]]
+
+def test_reader_reads_ranges_across_chunks_and_holes():
+    buffer = SpillBuffer(1024, MemoryBudget(1024))
+    buffer.write(0, b'abcd')
+    buffer.write(8, b'ijkl')
+    reader = buffer.reader()
+    reader.seek(2)
+    assert reader.read(4) == b'cd' + bytes(2)
+    assert reader.read(4) == bytes(2) + b'ij'
+    assert reader.read() == b'kl'
+    assert reader.read(4) == b''
+
+def test_far_chunk_does_not_allocate_the_hole():
+    buffer = SpillBuffer(1 << 20, MemoryBudget(1 << 20))
+    buffer.write(0, b'm' * 100)
+    buffer.write(400 * 1024 * 1024, b'x' * 1024)
+    tracemalloc.start()
+    try:
+        reader = buffer.reader()
+        assert reader.read(100) == b'm' * 100
+        reader.seek(400 * 1024 * 1024 - 4)
+        assert reader.read(8) == bytes(4) + b'xxxx'
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 1024 * 1024
@@ -0,0 +1,43 @@
+import hashlib
+import json
+import os
+import pytest
+from ReliableReciever import ReliableMulticastReceiver, TransferJournal, valid_transfer_id
+
+def file_info(transfer, name='file.bin', size=4):
+    packet = {'sequence': 0, 'type': 'FILE', 'ack_port': 9, 'transfer': transfer, 'data': {'name': name, 'size': size}}
+    packet['checksum'] = hashlib.md5(str(packet).encode()).hexdigest()
+    return json.dumps(packet).encode()
+
+@pytest.fixture
+def receiver(tmp_path):
+    save_dir = tmp_path / 'a' / 'b' / 'save'
+    save_dir.mkdir(parents=True)
+    receiver = ReliableMulticastReceiver('224.3.29.71', 10000, 'B', str(save_dir), open_socket=False, on_event=lambda event, info: None)
+    yield receiver
+    receiver._shutdown()
+
+def test_sender_ids_are_valid():
+    assert valid_transfer_id(os.urandom(4).hex())
+    assert not valid_transfer_id('/../../../escaped')
+    assert not valid_transfer_id('A1B2C3D4')
+    assert not valid_transfer_id('a1b2c3d4e')
+    assert not valid_transfer_id(None)
+    assert not valid_transfer_id(12345678)
+
+def test_forged_transfer_id_creates_nothing(receiver, tmp_path):
+    receiver._handle_packet(file_info('/../../../escaped'), ('127.0.0.1', 9))
+    assert receiver.transfers == {}
+    assert receiver._is_duplicate(0) is False
+    assert sorted(path.name for path in tmp_path.rglob('*')) == ['a', 'b', 'save']
+
+def test_valid_transfer_id_is_journaled(receiver):
+    receiver._handle_packet(file_info('a1b2c3d4'), ('127.0.0.1', 9))
+    assert 'a1b2c3d4' in receiver.transfers
+    assert os.path.exists(os.path.join(receiver.save_dir, '.a1b2c3d4.journal'))
+
+def test_journal_with_forged_transfer_id_is_not_loaded(tmp_path):
+    journal = TransferJournal(str(tmp_path), 'NOT-HEX!', 'file.bin', 4)
+    journal.close()
+    with pytest.raises(ValueError):
+        TransferJournal.load(str(tmp_path), journal.path)
@@ -0,0 +1,105 @@
+import os
+import pytest
+import ReliableReciever
+from ReliableReciever import TransferJournal, JOURNAL_RANGE, JOURNAL_CRC, WRITE_EXTENT
+
+def make_journal(tmp_path, size=10000):
+    return TransferJournal(str(tmp_path), 'a1b2c3d4', 'file.bin', size, repair=('10.0.0.1', 4000))
+
+def test_holes_cover_everything_missing(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, b'a' * 1000)
+    journal.add(1000, b'b' * 1000)
+    journal.add(5000, b'c' * 1000)
+    assert journal.holes() == [[2000, 3000], [6000, 4000]]
+    journal.close()
+
+def test_adjacent_chunks_become_one_record(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(1000, b'b' * 1000)
+    journal.add(0, b'a' * 1000)
+    journal.flush()
+    assert journal.ranges == [[0, 2000]]
+    journal.close()
+
+def test_duplicate_chunk_is_ignored(tmp_path):
+    journal = make_journal(tmp_path, 1000)
+    journal.add(0, b'a' * 1000)
+    journal.add(0, b'z' * 1000)
+    save_path = journal.publish(str(tmp_path / 'file.bin'))
+    with open(save_path, 'rb') as file:
+        assert file.read() == b'a' * 1000
+
+def test_load_restores_ranges_and_info(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, b'a' * 1000)
+    journal.add(4000, b'd' * 500)
+    journal.close()
+    loaded = TransferJournal.load(str(tmp_path), journal.path)
+    assert (loaded.transfer_id, loaded.name, loaded.size) == ('a1b2c3d4', 'file.bin', 10000)
+    assert loaded.repair == ('10.0.0.1', 4000)
+    assert loaded.holes() == [[1000, 3000], [4500, 5500]]
+    loaded.close()
+
+def test_load_drops_torn_record(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, b'a' * 1000)
+    journal.close()
+    good_size = os.path.getsize(journal.path)
+    # A record whose CRC does not match, as left by a crash mid-append
+    with open(journal.path, 'ab') as file:
+        file.write(JOURNAL_RANGE.pack(1000, 1000) + JOURNAL_CRC.pack(0))
+    loaded = TransferJournal.load(str(tmp_path), journal.path)
+    assert loaded.ranges == [[0, 1000]]
+    assert os.path.getsize(journal.path) == good_size
+    # New records follow the last good one
+    loaded.add(1000, b'b' * 1000)
+    loaded.close()
+    assert TransferJournal.load(str(tmp_path), journal.path).ranges == [[0, 1000], [1000, 1000]]
+
+def test_load_drops_partial_record(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add(0, b'a' * 1000)
+    journal.close()
+    with open(journal.path, 'ab') as file:
+        file.write(JOURNAL_RANGE.pack(1000, 1000)[:5])
+    assert TransferJournal.load(str(tmp_path), journal.path).ranges == [[0, 1000]]
+
+def test_load_rejects_damaged_header(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.close()
+    with open(journal.path, 'r+b') as file:
+        file.seek(20)
+        file.write(b'X')
+    with pytest.raises(ValueError):
+        TransferJournal.load(str(tmp_path), journal.path)
+
+def test_publish_moves_part_file_and_removes_journal(tmp_path):
+    journal = make_journal(tmp_path, 2000)
+    journal.add(1000, b'b' * 1000)
+    journal.add(0, b'a' * 1000)
+    save_path = journal.publish(str(tmp_path / 'file.bin'))
+    with open(save_path, 'rb') as file:
+        assert file.read() == b'a' * 1000 + b'b' * 1000
+    assert not os.path.exists(journal.path)
+    assert not os.path.exists(journal.part_path)
+
+@pytest.mark.parametrize('durability, syncs', [('none', 0), ('end', 1), ('periodic', 2)])
+def test_extents_are_synced_per_durability(tmp_path, monkeypatch, durability, syncs):
+    monkeypatch.setattr(ReliableReciever, 'SYNC_INTERVAL', 2 * WRITE_EXTENT)
+    journal = TransferJournal(str(tmp_path), 'a1b2c3d4', 'file.bin', 4 * WRITE_EXTENT, durability=durability)
+    calls = []
+    monkeypatch.setattr(ReliableReciever.os, 'fdatasync', calls.append)
+    for index in range(4):
+        journal.add(index * WRITE_EXTENT, b'x' * WRITE_EXTENT)
+    journal.publish(str(tmp_path / 'file.bin'))
+    assert len(calls) == syncs
+
+def test_periodic_records_wait_for_the_sync(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReliableReciever, 'SYNC_INTERVAL', 2 * WRITE_EXTENT)
+    journal = TransferJournal(str(tmp_path), 'a1b2c3d4', 'file.bin', 4 * WRITE_EXTENT, durability='periodic')
+    journal.add(0, b'x' * WRITE_EXTENT)
+    assert len(journal.records) == 1
+    journal.add(WRITE_EXTENT, b'x' * WRITE_EXTENT)
+    assert journal.records == [] and journal.unsynced == 0
+    journal.close()